@@ -4,83 +4,460 @@ A comprehensive AI-powered e-learning platform that generates
 learning materials, quizzes, flashcards, and more.
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, flash
+import os
+
+# Under gevent (GEVENT=1, served with `gunicorn -k gevent`) the blocking
+# socket calls made by the AI and internet fetchers yield to other
+# greenlets. Patching has to happen before anything else imports socket/ssl
+USE_GEVENT = os.environ.get('GEVENT') == '1'
+if USE_GEVENT:
+    from gevent import monkey
+    monkey.patch_all()
+
+from flask import (Flask, render_template, request, jsonify, send_file, session, redirect, url_for, flash, g,
+                   make_response, Response, stream_with_context, has_request_context)
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_caching import Cache
+from flask_compress import Compress
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from flask_session import Session
+import redis
+from sqlalchemy import event, insert, select, or_, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession, raiseload
+from sqlalchemy.pool import StaticPool
+from argon2 import PasswordHasher, Type as Argon2Type, exceptions as argon_exc
+from werkzeug.security import check_password_hash
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-import os
-from datetime import datetime
-import json
+import asyncio
+import hashlib
+import hmac
+import inspect
+import sqlite3
+import sys
+import io
+import jinja2
+import msgspec
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Import custom modules
-from modules.ai_generator import AIGenerator
-from modules.export_manager import ExportManager
+from modules.ai_generator import get_generator, MAX_FANOUT_ITEMS
+from modules.export_manager import ExportManager, MIME_TYPES, FILE_EXTENSIONS
 from modules.progress_tracker import ProgressTracker
 from modules.quiz_fetcher import QuizFetcher
 from modules.study_material_fetcher import StudyMaterialFetcher
+from modules.job_queue import JobQueue
+from modules.write_buffer import WriteBuffer
+from modules.json_provider import OrjsonProvider
+from modules.schemas import (GenerateRequest, BatchRequest, QuizRequest, FlashcardsRequest, DoubtRequest,
+                             LessonPlanRequest, HomeworkRequest, parse_request)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///edumentor.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///edumentor.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:'):
+    # An in-memory database lives and dies with its connection, so every
+    # thread has to share the same one
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False}
+    }
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 20,
+        'pool_pre_ping': True
+    }
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Wait up to 30s on a locked database
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {'check_same_thread': False, 'timeout': 30}
+
+def json_column_dumps(obj):
+    """Serialize a JSON column value - orjson instead of the stdlib encoder"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+# JSON columns (GeneratedContent.content/content_metadata) are encoded and
+# decoded by the engine - use orjson for both directions
+app.config['SQLALCHEMY_ENGINE_OPTIONS']['json_serializer'] = json_column_dumps
+app.config['SQLALCHEMY_ENGINE_OPTIONS']['json_deserializer'] = orjson.loads
+
+# Templates rendered by the page routes
+PAGE_TEMPLATES = [
+    'login.html', 'register.html', 'index.html', 'quiz.html', 'flashcards.html',
+    'doubt-solver.html', 'lesson-plan.html', 'homework.html', 'progress.html'
+]
+# Unset: Jinja's own per-user cache directory in the temp dir, which it
+# creates with mode 0700 and refuses to use if another user owns it
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR')
+
+# In production templates don't change between deploys - skip the stat() per render
+if os.environ.get('FLASK_ENV') == 'production':
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    app.jinja_env.auto_reload = False
+
+def private_cache_dir(path):
+    """
+    Create path if needed and make sure only this user can write to it -
+    the cache holds marshalled code objects that are loaded and executed
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        st = os.stat(path)
+        if st.st_uid != os.getuid() or st.st_mode & 0o022:
+            raise RuntimeError(f"JINJA_CACHE_DIR {path!r} must be owned by this user and not writable by others")
+    return path
+
+# Compiled templates are kept in a bytecode cache shared by workers and
+# restarts. Entries are keyed by a checksum of the template source, so an
+# edited template is simply recompiled - safe in development too
+if JINJA_CACHE_DIR:
+    app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache(private_cache_dir(JINJA_CACHE_DIR))
+else:
+    app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+
+# Largest question/card count the forms offer - the request schemas reject more
+app.jinja_env.globals['MAX_FANOUT_ITEMS'] = MAX_FANOUT_ITEMS
+# Compile every page up front so no request pays the parse cost
+for template in PAGE_TEMPLATES:
+    app.jinja_env.get_template(template)
+
+# Response compression - Brotli preferred, gzip fallback
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_BR_LEVEL'] = 4  # Good ratio for little CPU
+app.config['COMPRESS_MIN_SIZE'] = 512
+
+# Shared Redis instance (optional) - used as the cache backend when set
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    app.config['CACHE_TYPE'] = 'RedisCache'
+    app.config['CACHE_REDIS_URL'] = REDIS_URL
+else:
+    app.config['CACHE_TYPE'] = 'SimpleCache'  # In-process cache for development
+
+# Server-side sessions in Redis when available - the cookie only carries an
+# opaque session id instead of the signed, serialized session data
+if REDIS_URL:
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.Redis.from_url(REDIS_URL)
+    app.config['SESSION_USE_SIGNER'] = True
+    app.config['SESSION_PERMANENT'] = False
+
+# Make lazy relationship loads raise instead of silently querying, so N+1
+# patterns fail loudly during development (always on when app.debug is set)
+app.config['SQLALCHEMY_RAISELOAD'] = os.environ.get('SQLALCHEMY_RAISELOAD') == '1'
+
+# Count SQL statements per request and report them in an X-SQL-Count header
+# (always on when app.debug is set) to spot N+1 regressions
+app.config['SQL_QUERY_COUNT'] = os.environ.get('SQL_QUERY_COUNT') == '1'
+
+# URL prefix of an internal nginx location mapped to the exports/ directory
+# (e.g. /_exports/). When set, exports are written to disk and nginx sends
+# the file via X-Accel-Redirect instead of the bytes passing through Python
+app.config['EXPORT_ACCEL_REDIRECT'] = os.environ.get('EXPORT_ACCEL_REDIRECT', '')
+
+# Most quiz questions one /generate/batch request may ask for across its
+# items - each question is a separate AI call
+MAX_BATCH_QUESTIONS = 100
+# Content types /generate/stream accepts - quizzes and flashcards are JSON and only usable once complete
+STREAMABLE_CONTENT_TYPES = frozenset({'notes', 'summary', 'diagram_description', 'video_script'})
+# How long (seconds) AI responses are reused for identical requests
+AI_CACHE_TIMEOUT = int(os.environ.get('AI_CACHE_TIMEOUT', 86400))
+# Number of background threads running queued generation jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+# Job state lives in the app cache. Without Redis that cache is per process,
+# so under several workers a /jobs poll can land on one that never saw the
+# job - slow routes then only run in the background when the client asks
+BACKGROUND_BY_DEFAULT = bool(REDIS_URL)
+# Generating notes for a topic also warms the cache with its quiz and
+# flashcards in the background, so the follow-up clicks are cache hits
+PREFETCH_RELATED = os.environ.get('PREFETCH_RELATED', '1') == '1'
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Tune SQLite connections for a concurrent web workload"""
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        cursor = dbapi_conn.cursor()
+        # WAL lets readers run alongside a writer, and with synchronous=NORMAL
+        # commits no longer fsync the main database file
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA cache_size=-65536')  # 64 MiB page cache
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA mmap_size=268435456')  # 256 MiB memory-mapped I/O
+        cursor.close()
+
+@event.listens_for(OrmSession, 'do_orm_execute')
+def raise_on_lazy_loads(orm_execute_state):
+    """
+    In debug mode, apply raiseload('*') to every top-level ORM select,
+    session.get() included. Relationships declared with an eager loader are
+    overridden too - a query that needs a relationship has to ask for it
+    with selectinload()/joinedload(), which takes precedence over the wildcard
+    """
+    if not (app.debug or app.config['SQLALCHEMY_RAISELOAD']):
+        return
+    if (orm_execute_state.is_select
+            and not orm_execute_state.is_column_load
+            and not orm_execute_state.is_relationship_load):
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload('*'))
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    """Tally statements run on behalf of the current request"""
+    if has_request_context() and (app.debug or app.config['SQL_QUERY_COUNT']):
+        g.sql_count = g.get('sql_count', 0) + 1
 
 # Initialize extensions
 db = SQLAlchemy(app)
+if REDIS_URL:
+    Session(app)
+cache = Cache(app)
+Compress(app)
+# Rate limits bound how much password-hashing CPU a single client can consume
+limiter = Limiter(get_remote_address, app=app, storage_uri=REDIS_URL or 'memory://')
+
+# Password hasher - Argon2id with the OWASP 46 MiB / 2 iterations / 1 lane
+# profile. Cost parameters are read from the environment so they can be raised
+# over time without a code change (existing hashes are upgraded transparently
+# on the next successful login)
+PH = PasswordHasher(
+    time_cost=int(os.environ.get('ARGON2_TIME', 2)),
+    memory_cost=int(os.environ.get('ARGON2_MEM', 46 * 1024)),  # KiB
+    parallelism=int(os.environ.get('ARGON2_PAR', 1)),
+    type=Argon2Type.ID
+)
+ARGON2ID_PREFIX = '$argon2id$'
+# Hash verified against when a login names an unknown user, so that branch
+# costs the same as a wrong password and usernames can't be enumerated by timing
+DUMMY_HASH = PH.hash('x' * 16)
+# Dedicated pool for password hashing, sized to the CPU count. Argon2 runs in
+# C with the GIL released, so threads hash in parallel while a burst of logins
+# can only ever occupy this many cores instead of every request thread.
+# Under gevent, patched threads are greenlets that would stall the whole
+# worker while hashing, so gevent's pool of real OS threads is used instead
+if USE_GEVENT:
+    from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+    HASH_POOL = GeventThreadPoolExecutor(max_workers=os.cpu_count())
+else:
+    HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='edumentor-hash')
+
+def _verify(password_hash, password):
+    """Check a password against its hash, returning a bool instead of raising"""
+    # Accounts created before the switch to Argon2 still carry Werkzeug
+    # (pbkdf2/scrypt) hashes - they are migrated on their next login
+    if not password_hash.startswith('$argon2'):
+        return check_password_hash(password_hash, password)
+    try:
+        return PH.verify(password_hash, password)
+    except (argon_exc.VerificationError, argon_exc.InvalidHashError):
+        return False
+
+def hash_password(password):
+    """Hash a password on the hashing pool"""
+    return HASH_POOL.submit(PH.hash, password).result()
+
+def verify_password(password_hash, password):
+    """Verify a password on the hashing pool"""
+    return HASH_POOL.submit(_verify, password_hash, password).result()
 
 # Initialize custom modules (ProgressTracker will be initialized after Progress model is defined)
-ai_generator = AIGenerator()
+ai_generator = get_generator()
 export_manager = ExportManager()
 # Initialize quiz fetcher with AI generator as fallback
 quiz_fetcher = QuizFetcher(ai_generator=ai_generator)
 # Initialize study material fetcher with AI generator for compiling internet content
 study_material_fetcher = StudyMaterialFetcher(ai_generator=ai_generator)
+# Background jobs for requests that opt in with "background": true
+job_queue = JobQueue(app, cache, max_workers=JOB_WORKERS)
+# Prefetches are best-effort, so they get their own small pool rather than
+# competing with user jobs
+PREFETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='edumentor-prefetch')
+
+# Cached AI calls - the LLM round trip dominates these routes, so identical
+# requests are answered from the cache instead. The topic (first argument) is
+# normalized in the cache key only, so "Photosynthesis " and "photosynthesis"
+# share an entry while the AI still sees the topic as the user typed it
+def normalize_topic(topic):
+    """Canonical form of a topic used in cache keys"""
+    return topic.strip().lower()
+
+def ai_cache_key(f, args):
+    """Cache key for a call of the AI helper f"""
+    if args and isinstance(args[0], str):
+        args = (normalize_topic(args[0]),) + args[1:]
+    return f"ai:{f.__name__}:" + hashlib.blake2b(repr(args).encode(), digest_size=16).hexdigest()
+
+def with_topic(result, args):
+    """A cached payload relabelled with this caller's spelling of the topic"""
+    if isinstance(result, dict) and 'topic' in result and args and isinstance(args[0], str):
+        return {**result, 'topic': args[0]}
+    return result
+
+def ai_memoize(f):
+    """
+    Memoize an AI helper for AI_CACHE_TIMEOUT seconds and record in g.ai_cache
+    whether the request was answered from the cache (reported as X-Cache)
+    """
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_wrapper(*args):
+            key = ai_cache_key(f, args)
+            g.ai_cache = g.get('ai_cache', 'HIT')
+            result = cache.get(key)
+            if result is None:
+                g.ai_cache = 'MISS'
+                result = await f(*args)
+                cache.set(key, result, timeout=AI_CACHE_TIMEOUT)
+            return with_topic(result, args)
+        return async_wrapper
+    
+    @wraps(f)
+    def wrapper(*args):
+        key = ai_cache_key(f, args)
+        g.ai_cache = g.get('ai_cache', 'HIT')
+        result = cache.get(key)
+        if result is None:
+            g.ai_cache = 'MISS'
+            result = f(*args)
+            cache.set(key, result, timeout=AI_CACHE_TIMEOUT)
+        return with_topic(result, args)
+    return wrapper
+
+@ai_memoize
+def _ai_generate(topic, content_type, difficulty, language):
+    return ai_generator.generate(topic=topic, content_type=content_type, difficulty=difficulty, language=language)
+
+@ai_memoize
+def _ai_fetch_quiz(topic, num_questions, difficulty):
+    return quiz_fetcher.fetch_quiz(topic=topic, num_questions=num_questions, difficulty=difficulty)
+
+@ai_memoize
+def _ai_generate_quiz(topic, num_questions, difficulty):
+    return ai_generator.generate_quiz(topic=topic, num_questions=num_questions, difficulty=difficulty)
+
+@ai_memoize
+def _ai_generate_flashcards(topic, num_cards):
+    return ai_generator.generate_flashcards(topic=topic, num_cards=num_cards)
+
+@ai_memoize
+async def _ai_solve_doubt(question, context):
+    return await ai_generator.asolve_doubt(question, context)
+
+@ai_memoize
+def _ai_generate_lesson_plan(topic, duration, grade_level):
+    return ai_generator.generate_lesson_plan(topic=topic, duration=duration, grade_level=grade_level)
+
+@ai_memoize
+def _ai_generate_homework(topic, difficulty):
+    return ai_generator.generate_homework(topic=topic, difficulty=difficulty)
+
+@app.after_request
+def add_sql_count_header(response):
+    """Report how many SQL statements the request ran"""
+    if app.debug or app.config['SQL_QUERY_COUNT']:
+        count = g.get('sql_count', 0)
+        response.headers['X-SQL-Count'] = str(count)
+        app.logger.debug('%s %s ran %d SQL statements', request.method, request.path, count)
+    return response
+
+@app.after_request
+def add_ai_cache_headers(response):
+    """Report whether AI content came from the cache"""
+    if 'ai_cache' in g:
+        response.headers['X-Cache'] = g.ai_cache
+        response.headers['Cache-Control'] = f'private, max-age={AI_CACHE_TIMEOUT}'
+    return response
 
 # Database Models
 class User(db.Model):
     """User model for storing user information and progress"""
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
+    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(512), nullable=False)
     role = db.Column(db.String(20), default='student', nullable=False)  # student, teacher, admin
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    progress = db.relationship('Progress', backref='user', lazy=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Loaded only on access - logins and session lookups never need them. Code
+    # that walks these for many users should add selectinload() to its query
+    progress = db.relationship('Progress', back_populates='user')
+    generated_content = db.relationship('GeneratedContent', back_populates='user')
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Check if password matches"""
-        return check_password_hash(self.password_hash, password)
+        """Check if password matches, rehashing if the cost parameters changed"""
+        if not verify_password(self.password_hash, password):
+            return False
+        self.rehash_password_if_needed(password)
+        return True
+    
+    def rehash_password_if_needed(self, password):
+        """Re-hash a verified password that is a legacy hash or uses outdated Argon2 costs"""
+        if (not self.password_hash.startswith(ARGON2ID_PREFIX)
+                or PH.check_needs_rehash(self.password_hash)):
+            self.set_password(password)
+            db.session.commit()
 
 class Progress(db.Model):
     """Progress tracking model"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     topic = db.Column(db.String(200), nullable=False)
     difficulty_level = db.Column(db.String(20), default='medium')
     score = db.Column(db.Float, default=0.0)
-    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, server_default=db.func.now())
     data = db.Column(db.Text)  # JSON data for additional progress info
+    user = db.relationship('User', back_populates='progress')
 
 class GeneratedContent(db.Model):
     """Store generated content for later retrieval"""
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Track who generated it
-    content_type = db.Column(db.String(50), nullable=False)  # notes, quiz, flashcard, etc.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)  # Track who generated it
+    content_type = db.Column(db.String(50), nullable=False, index=True)  # notes, quiz, flashcard, etc.
     topic = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    content_metadata = db.Column(db.Text)  # JSON metadata
+    content = db.Column(db.JSON, nullable=False)  # Generated payload, (de)serialized by the driver
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    content_metadata = db.Column(db.JSON)
+    content_hash = db.Column(db.String(32), index=True)  # Hash of the generation request, see request_hash()
+    user = db.relationship('User', back_populates='generated_content')
 
-# Initialize ProgressTracker after Progress model is defined
-progress_tracker = ProgressTracker(db, Progress)
+# Composite indexes for the per-user "latest first" lookups
+db.Index('ix_progress_user_completed', Progress.user_id, Progress.completed_at.desc())
+db.Index('ix_gc_user_type_created', GeneratedContent.user_id,
+         GeneratedContent.content_type, GeneratedContent.created_at.desc())
+# Recent scores for one topic (adaptive difficulty). Ascending, so a
+# backwards scan yields completed_at DESC, id DESC with no sort step
+db.Index('ix_progress_user_topic_completed', Progress.user_id, Progress.topic, Progress.completed_at)
+
+# Initialize ProgressTracker after Progress model is defined. Progress updates
+# from concurrent requests are batched into one INSERT/commit in the background
+progress_tracker = ProgressTracker(db, Progress, write_buffer=WriteBuffer(app, db, Progress))
+
+@cache.memoize(timeout=3600)
+def load_generated_content(content_id):
+    """Stored content payload by id - rows are never updated, so repeat exports skip the database"""
+    row = db.session.execute(
+        select(GeneratedContent.content).where(GeneratedContent.id == content_id)
+    ).first()
+    return row.content if row else None
+
+# Authentication Helpers
+def login_user(user):
+    """Start a session for user"""
+    session['user_id'] = user.id
+    session['username'] = user.username
+    session['role'] = user.role
 
 # Authentication Decorators
 def login_required(f):
@@ -92,29 +469,55 @@ def login_required(f):
                 return jsonify({'error': 'Authentication required'}), 401
             flash('Please login to access this page', 'warning')
             return redirect(url_for('login'))
-        return f(*args, **kwargs)
+        # ensure_sync lets the wrapped view be either a plain or an async function
+        return app.ensure_sync(f)(*args, **kwargs)
     return decorated_function
 
 def role_required(*roles):
     """Decorator to require specific role(s)"""
+    allowed = frozenset(roles)
+    
     def decorator(f):
         @wraps(f)
         @login_required
         def decorated_function(*args, **kwargs):
-            user_id = session.get('user_id')
-            if user_id:
-                user = User.query.get(user_id)
-                if user and user.role not in roles:
-                    if request.is_json:
-                        return jsonify({'error': 'Insufficient permissions'}), 403
-                    flash('You do not have permission to access this page', 'danger')
-                    return redirect(url_for('index'))
-            return f(*args, **kwargs)
+            # The role is stored in the session at login, so authorization is
+            # a set lookup with no database query
+            if session.get('role') in allowed:
+                return app.ensure_sync(f)(*args, **kwargs)
+            
+            if request.is_json:
+                return jsonify({'error': 'Insufficient permissions'}), 403
+            flash('You do not have permission to access this page', 'danger')
+            return redirect(url_for('index'))
         return decorated_function
     return decorator
 
+# Error Handlers
+@app.errorhandler(msgspec.DecodeError)
+def handle_invalid_body(e):
+    """Reject request bodies that are not valid JSON or don't match the route's schema"""
+    return jsonify({'error': f'Invalid request: {e}'}), 400
+
+@app.errorhandler(429)
+def handle_rate_limited(e):
+    """Tell clients that hit a rate limit to slow down"""
+    message = 'Too many attempts. Please try again later.'
+    if request.is_json or request.endpoint not in ('login', 'register'):
+        return jsonify({'error': message}), 429
+    flash(message, 'danger')
+    return render_template(f'{request.endpoint}.html'), 429
+
+def login_rate_key():
+    """Rate-limit key for login attempts against one account, falling back to the client IP"""
+    data = request.get_json(silent=True) or request.form
+    username = str(data.get('username', '')).strip().lower()
+    return f"login:{username}" if username else get_remote_address()
+
 # Authentication Routes
 @app.route('/login', methods=['GET', 'POST'])
+@limiter.limit('20 per minute', methods=['POST'])  # Per client IP
+@limiter.limit('5 per minute; 20 per hour', key_func=login_rate_key, methods=['POST'])
 def login():
     """User login page"""
     if request.method == 'POST':
@@ -128,15 +531,20 @@ def login():
             flash('Username and password are required', 'danger')
             return render_template('login.html')
         
-        # Find user by username or email
-        user = User.query.filter(
-            (User.username == username) | (User.email == username)
-        ).first()
+        # Find user by username or email - separate lookups so each uses its
+        # unique index, and the email probe only runs for email-shaped input
+        user = User.query.filter_by(username=username).first()
+        if user is None and '@' in username:
+            user = User.query.filter_by(email=username).first()
+        
+        # Always run a full hash verification (against a dummy hash when the
+        # user doesn't exist) so both failure paths take the same time
+        target_hash = user.password_hash if user else DUMMY_HASH
+        pw_ok = verify_password(target_hash, password)
         
-        if user and user.check_password(password):
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['role'] = user.role
+        if user is not None and hmac.compare_digest(b'1' if pw_ok else b'0', b'1'):
+            user.rehash_password_if_needed(password)
+            login_user(user)
             
             if request.is_json:
                 return jsonify({
@@ -163,6 +571,7 @@ def login():
     return render_template('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
+@limiter.limit('3 per minute', methods=['POST'])
 def register():
     """User registration page"""
     if request.method == 'POST':
@@ -193,17 +602,17 @@ def register():
             flash('Password must be at least 6 characters', 'danger')
             return render_template('register.html')
         
-        # Check if username or email already exists
-        if User.query.filter_by(username=username).first():
-            if request.is_json:
-                return jsonify({'error': 'Username already exists'}), 400
-            flash('Username already exists', 'danger')
-            return render_template('register.html')
-        
-        if User.query.filter_by(email=email).first():
+        # Check if username or email already exists - one query for both
+        taken = db.session.execute(
+            select(User.username, User.email)
+            .where(or_(User.username == username, User.email == email))
+            .limit(1)
+        ).first()
+        if taken:
+            message = 'Username already exists' if taken.username == username else 'Email already exists'
             if request.is_json:
-                return jsonify({'error': 'Email already exists'}), 400
-            flash('Email already exists', 'danger')
+                return jsonify({'error': message}), 400
+            flash(message, 'danger')
             return render_template('register.html')
         
         # Create new user
@@ -215,9 +624,7 @@ def register():
             db.session.commit()
             
             # Auto-login after registration
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['role'] = user.role
+            login_user(user)
             
             if request.is_json:
                 return jsonify({
@@ -231,6 +638,14 @@ def register():
                 })
             flash('Registration successful! Welcome!', 'success')
             return redirect(url_for('index'))
+        except IntegrityError:
+            # The unique constraints are the authoritative check when two
+            # registrations for the same name race past the query above
+            db.session.rollback()
+            if request.is_json:
+                return jsonify({'error': 'Username or email already exists'}), 400
+            flash('Username or email already exists', 'danger')
+            return render_template('register.html')
         except Exception as e:
             db.session.rollback()
             if request.is_json:
@@ -252,150 +667,320 @@ def logout():
     return redirect(url_for('login'))
 
 # Routes
+def conditional_response(response):
+    """
+    Replace response with a bodiless 304 when the client's If-None-Match
+    matches its ETag. Flask-Compress appends ':<encoding>' to the ETags of
+    compressed responses (and proxies may mark them weak), so that suffix is
+    ignored when comparing and the 304 repeats the validator the client sent
+    """
+    response.headers['Cache-Control'] = 'private, no-cache'
+    etag, _ = response.get_etag()
+    if_none_match = request.if_none_match
+    for tag in if_none_match.as_set(include_weak=True):
+        if tag.split(':', 1)[0] == etag:
+            return app.response_class(status=304, headers={
+                'ETag': f'W/"{tag}"' if if_none_match.is_weak(tag) else f'"{tag}"',
+                'Cache-Control': response.headers['Cache-Control']
+            })
+    return response
+
+def render_page(template):
+    """Render a page with an ETag so unchanged pages revalidate with a 304"""
+    response = make_response(render_template(template))
+    response.add_etag()
+    return conditional_response(response)
+
 @app.route('/')
 def index():
     """Main landing page"""
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route('/quiz')
 @login_required
 def quiz_page():
     """Quiz generation page - requires login"""
-    return render_template('quiz.html')
+    return render_page('quiz.html')
 
 @app.route('/flashcards')
 @login_required
 def flashcards_page():
     """Flashcards generation page - requires login"""
-    return render_template('flashcards.html')
+    return render_page('flashcards.html')
 
 @app.route('/doubt-solver')
 @login_required
 def doubt_solver_page():
     """Doubt solver page - requires login"""
-    return render_template('doubt-solver.html')
+    return render_page('doubt-solver.html')
 
 @app.route('/lesson-plan')
 @role_required('teacher', 'admin')
 def lesson_plan_page():
     """Lesson plan generation page - requires teacher or admin role"""
-    return render_template('lesson-plan.html')
+    return render_page('lesson-plan.html')
 
 @app.route('/homework')
 @role_required('teacher', 'admin')
 def homework_page():
     """Homework generation page - requires teacher or admin role"""
-    return render_template('homework.html')
+    return render_page('homework.html')
 
 @app.route('/progress')
 @login_required
 def progress_page():
     """Progress tracking page - requires login"""
-    return render_template('progress.html')
+    # This route also receives progress.js's fetch('/progress'), which
+    # prefers JSON - answer it with the progress data instead of the page
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json':
+        return progress_response(session.get('user_id'))
+    return render_page('progress.html')
+
+def build_content(topic, content_type='notes', difficulty='medium', language='en',
+                  use_internet=False, num_questions=10):
+    """Generate the content payload for one /generate request"""
+    # Handle quiz generation specially - use dedicated quiz generation
+    if content_type == 'quiz':
+        # Generate quiz questions based on the user's topic
+        quiz_result = _ai_generate_quiz(topic, num_questions, difficulty)
+        
+        # Format quiz result to match expected structure
+        # Include the topic in the result so frontend can display it
+        return {
+            'type': 'quiz',
+            'topic': topic,  # Store the topic for reference
+            'questions': quiz_result.get('questions', []),
+            'difficulty': difficulty
+        }
+    # Generate content - use internet sources if requested
+    elif use_internet:
+        # Fetch from internet and compile using AI - never cached, the
+        # point is fresh material
+        return study_material_fetcher.compile_study_material(
+            topic=topic,
+            content_type=content_type,
+            difficulty=difficulty,
+            language=language
+        )
+    # Generate content using AI only
+    return _ai_generate(topic, content_type, difficulty, language)
+
+def _prefetch_related(topic, difficulty):
+    """Generate the default-sized quiz and flashcard deck for a topic into the AI cache"""
+    with app.app_context():
+        try:
+            # Sizes match the request defaults, which is what a follow-up click asks for
+            _ai_generate_quiz(topic, 10, difficulty)
+            _ai_generate_flashcards(topic, 20)
+        except Exception:
+            app.logger.exception('Prefetching related content for %r failed', topic)
+
+def prefetch_related(topic, difficulty):
+    """Queue _prefetch_related unless the topic was prefetched within AI_CACHE_TIMEOUT"""
+    # cache.add only succeeds for the first caller, so concurrent requests
+    # for a popular topic start one prefetch between them
+    if cache.add(f"prefetch:{normalize_topic(topic)}:{difficulty}", True, timeout=AI_CACHE_TIMEOUT):
+        PREFETCH_POOL.submit(_prefetch_related, topic, difficulty)
+
+def request_hash(topic, content_type, difficulty, language, use_internet, num_questions):
+    """Stable key identifying a generation request, stored as GeneratedContent.content_hash"""
+    key = f"{content_type}|{normalize_topic(topic)}|{difficulty}|{language}|{bool(use_internet)}"
+    if content_type == 'quiz':
+        key += f"|{num_questions}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+def content_row(user_id, topic, content_type, difficulty, language, use_internet, result, num_questions=10):
+    """Column values for a GeneratedContent insert"""
+    return {
+        'user_id': user_id,
+        'content_type': content_type,
+        'topic': topic,
+        'content_hash': request_hash(topic, content_type, difficulty, language, use_internet, num_questions),
+        'content': result,
+        'content_metadata': {
+            'difficulty': difficulty,
+            'language': language,
+            'use_internet': use_internet
+        }
+    }
+
+def generate_and_store(user_id, topic, content_type='notes', difficulty='medium', language='en',
+                       use_internet=False, num_questions=10):
+    """Generate content (or reuse a stored copy) and return the /generate response payload"""
+    # Identical requests reuse previously generated content - a single
+    # indexed lookup instead of another LLM round trip. Internet-sourced
+    # content is always fetched fresh
+    if not use_internet:
+        content_hash = request_hash(topic, content_type, difficulty, language, use_internet, num_questions)
+        existing = db.session.execute(
+            select(GeneratedContent.id, GeneratedContent.content)
+            .where(GeneratedContent.content_hash == content_hash)
+            .order_by(GeneratedContent.id.desc())
+            .limit(1)
+        ).first()
+        if existing:
+            g.ai_cache = 'HIT'
+            return {'content': existing.content, 'content_id': existing.id}
+    
+    result = build_content(topic, content_type, difficulty, language, use_internet, num_questions)
+    
+    # Save to database - a Core INSERT ... RETURNING gets the new id back
+    # without a separate SELECT or ORM unit-of-work bookkeeping
+    content_id = db.session.execute(
+        insert(GeneratedContent)
+        .values(content_row(user_id, topic, content_type, difficulty, language, use_internet,
+                            result, num_questions))
+        .returning(GeneratedContent.id)
+    ).scalar_one()
+    db.session.commit()
+    
+    if PREFETCH_RELATED and content_type == 'notes' and not use_internet:
+        prefetch_related(topic, difficulty)
+    
+    return {'content': result, 'content_id': content_id}
+
+def queue_job(func, *args):
+    """Run func in the background for the current user and return a 202 response with the job id"""
+    job_id = job_queue.submit(func, *args, owner_id=session.get('user_id'))
+    return jsonify({'success': True, 'job_id': job_id}), 202
 
 @app.route('/generate', methods=['POST'])
 @login_required
 def generate_content():
     """Generate learning content based on topic and content type - requires login"""
+    req = parse_request(request.get_data(), GenerateRequest)
     try:
         user_id = session.get('user_id')
-        data = request.json
-        topic = data.get('topic', '')
-        content_type = data.get('content_type', 'notes')  # notes, summary, quiz, etc.
-        difficulty = data.get('difficulty', 'medium')
-        language = data.get('language', 'en')
-        use_internet = data.get('use_internet', False)  # Option to generate from internet
+        topic = req.topic.strip()
         
         if not topic:
             return jsonify({'error': 'Topic is required'}), 400
         
-        # Handle quiz generation specially - use dedicated quiz generation
-        if content_type == 'quiz':
-            # Validate topic is not empty (already checked above, but ensure it's clean)
-            topic = topic.strip()
-            if not topic:
-                return jsonify({'error': 'Topic is required for quiz generation'}), 400
-            
-            # Generate quiz questions directly using AI for the given topic
-            # The topic entered by the user is passed to generate topic-specific questions
-            num_questions = data.get('num_questions', 10)  # Default to 10 questions
-            
-            # Generate quiz questions based on the user's topic
-            quiz_result = ai_generator.generate_quiz(
-                topic=topic,  # User's entered topic - used to generate relevant questions
-                num_questions=num_questions,
-                difficulty=difficulty
-            )
-            
-            # Format quiz result to match expected structure
-            # Include the topic in the result so frontend can display it
-            result = {
-                'type': 'quiz',
-                'topic': topic,  # Store the topic for reference
-                'questions': quiz_result.get('questions', []),
-                'difficulty': difficulty
-            }
-        # Generate content - use internet sources if requested
-        elif use_internet:
-            # Fetch from internet and compile using AI
-            result = study_material_fetcher.compile_study_material(
-                topic=topic,
-                content_type=content_type,
-                difficulty=difficulty,
-                language=language
-            )
+        args = (user_id, topic, req.content_type, req.difficulty, req.language,
+                req.use_internet, req.num_questions)
+        # Internet-sourced generation scrapes several pages before the LLM
+        # call, so unless the client says otherwise it runs as a job
+        if req.background is None:
+            background = req.use_internet and BACKGROUND_BY_DEFAULT
         else:
-            # Generate content using AI only
-            result = ai_generator.generate(
-                topic=topic,
-                content_type=content_type,
-                difficulty=difficulty,
-                language=language
-            )
+            background = req.background
+        if background:
+            return queue_job(generate_and_store, *args)
         
-        # Save to database
-        content = GeneratedContent(
-            user_id=user_id,
-            content_type=content_type,
-            topic=topic,
-            content=json.dumps(result),
-            content_metadata=json.dumps({
-                'difficulty': difficulty, 
-                'language': language,
-                'use_internet': use_internet
-            })
-        )
-        db.session.add(content)
-        db.session.commit()
+        return jsonify({'success': True, **generate_and_store(*args)})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/generate/stream', methods=['GET', 'POST'])
+@login_required
+def generate_content_stream():
+    """
+    Generate text learning content streamed as Server-Sent Events - requires login
+    Accepts a JSON body (POST) or query parameters (GET, for EventSource)
+    """
+    data = request.get_json(silent=True) or request.args
+    topic = str(data.get('topic', '')).strip()
+    content_type = data.get('content_type', 'notes')
+    difficulty = data.get('difficulty', 'medium')
+    language = data.get('language', 'en')
+    
+    if not topic:
+        return jsonify({'error': 'Topic is required'}), 400
+    if content_type not in STREAMABLE_CONTENT_TYPES:
+        return jsonify({'error': f'Content type {content_type!r} cannot be streamed'}), 400
+    
+    def events():
+        for chunk in ai_generator.generate_stream(topic, content_type, difficulty, language):
+            yield b"data: " + orjson.dumps({'chunk': chunk}) + b"\n\n"
+        yield b"data: " + orjson.dumps({'done': True}) + b"\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        # identity encoding stops the compression middleware from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Content-Encoding': 'identity'}
+    )
+
+async def build_batch(specs):
+    """Generate the content payloads for several /generate/batch items"""
+    # The items are independent LLM/web round trips - run them concurrently
+    # so the batch takes about as long as its slowest item, not their sum
+    return await asyncio.gather(*(asyncio.to_thread(build_content, *spec) for spec in specs))
+
+def store_batch(user_id, specs, results):
+    """Save generated batch items in one transaction and return the /generate/batch response payload"""
+    rows = [
+        content_row(user_id, topic, content_type, difficulty, language, use_internet,
+                    result, num_questions)
+        for (topic, content_type, difficulty, language, use_internet, num_questions), result
+        in zip(specs, results)
+    ]
+    
+    # One executemany INSERT and a single commit for the whole batch
+    content_ids = db.session.scalars(
+        insert(GeneratedContent).returning(GeneratedContent.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+    db.session.commit()
+    
+    return {
+        'items': [
+            {'content': result, 'content_id': content_id}
+            for result, content_id in zip(results, content_ids)
+        ]
+    }
+
+def generate_batch_and_store(user_id, specs):
+    """Generate and save a whole batch - the background job version of /generate/batch"""
+    return store_batch(user_id, specs, asyncio.run(build_batch(specs)))
+
+@app.route('/generate/batch', methods=['POST'])
+@login_required
+async def generate_content_batch():
+    """Generate several content items and save them in one transaction - requires login"""
+    req = parse_request(request.get_data(), BatchRequest)
+    try:
+        user_id = session.get('user_id')
         
-        return jsonify({
-            'success': True,
-            'content': result,
-            'content_id': content.id
-        })
+        if any(not item.topic.strip() for item in req.items):
+            return jsonify({'error': 'Topic is required for every item'}), 400
+        if sum(item.num_questions for item in req.items if item.content_type == 'quiz') > MAX_BATCH_QUESTIONS:
+            return jsonify({'error': f'At most {MAX_BATCH_QUESTIONS} quiz questions can be generated per batch'}), 400
+        
+        specs = [
+            (item.topic.strip(), item.content_type, item.difficulty, item.language,
+             item.use_internet, item.num_questions)
+            for item in req.items
+        ]
+        
+        # Bulk imports care about throughput rather than latency, so they
+        # can hand the batch to a job and poll for it
+        if req.background:
+            return queue_job(generate_batch_and_store, user_id, specs)
+        
+        results = await build_batch(specs)
+        return jsonify({'success': True, **store_batch(user_id, specs, results)})
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/quiz', methods=['POST'])
 @login_required
 def generate_quiz():
     """Generate quiz with questions and answers from internet sources - requires login"""
+    req = parse_request(request.get_data(), QuizRequest)
     try:
-        data = request.json
-        topic = data.get('topic', '')
-        num_questions = data.get('num_questions', 10)
-        difficulty = data.get('difficulty', 'medium')
-        
-        if not topic:
+        if not req.topic:
             return jsonify({'error': 'Topic is required'}), 400
         
+        background = BACKGROUND_BY_DEFAULT if req.background is None else req.background
+        if background:
+            return queue_job(_ai_fetch_quiz, req.topic, req.num_questions, req.difficulty)
+        
         # Fetch quiz from internet sources (with AI fallback)
-        quiz = quiz_fetcher.fetch_quiz(
-            topic=topic,
-            num_questions=num_questions,
-            difficulty=difficulty
-        )
+        quiz = _ai_fetch_quiz(req.topic, req.num_questions, req.difficulty)
         
         return jsonify({'success': True, 'quiz': quiz})
     
@@ -433,11 +1018,7 @@ def generate_quiz_questions():
         
         # Generate quiz questions directly using AI
         # This ensures we always get questions related to the specific topic
-        quiz = ai_generator.generate_quiz(
-            topic=topic,
-            num_questions=num_questions,
-            difficulty=difficulty
-        )
+        quiz = _ai_generate_quiz(topic, num_questions, difficulty)
         
         # Validate that we got questions
         if not quiz or not quiz.get('questions'):
@@ -461,18 +1042,15 @@ def generate_quiz_questions():
 @login_required
 def generate_flashcards():
     """Generate flashcards for a topic - requires login"""
+    req = parse_request(request.get_data(), FlashcardsRequest)
     try:
-        data = request.json
-        topic = data.get('topic', '')
-        num_cards = data.get('num_cards', 20)
-        
-        if not topic:
+        if not req.topic:
             return jsonify({'error': 'Topic is required'}), 400
         
-        flashcards = ai_generator.generate_flashcards(
-            topic=topic,
-            num_cards=num_cards
-        )
+        if req.background:
+            return queue_job(_ai_generate_flashcards, req.topic, req.num_cards)
+        
+        flashcards = _ai_generate_flashcards(req.topic, req.num_cards)
         
         return jsonify({'success': True, 'flashcards': flashcards})
     
@@ -481,23 +1059,46 @@ def generate_flashcards():
 
 @app.route('/doubt-solve', methods=['POST'])
 @login_required
-def solve_doubt():
+async def solve_doubt():
     """AI-powered doubt solving - requires login"""
+    req = parse_request(request.get_data(), DoubtRequest)
     try:
-        data = request.json
-        question = data.get('question', '')
-        context = data.get('context', '')
-        
-        if not question:
+        if not req.question:
             return jsonify({'error': 'Question is required'}), 400
         
-        answer = ai_generator.solve_doubt(question, context)
+        answer = await _ai_solve_doubt(req.question, req.context)
         
         return jsonify({'success': True, 'answer': answer})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/doubt-solve/stream', methods=['GET', 'POST'])
+@login_required
+def solve_doubt_stream():
+    """
+    AI-powered doubt solving streamed as Server-Sent Events - requires login
+    Accepts a JSON body (POST) or query parameters (GET, for EventSource)
+    """
+    data = request.get_json(silent=True) or request.args
+    question = data.get('question', '')
+    context = data.get('context', '')
+    
+    if not question:
+        return jsonify({'error': 'Question is required'}), 400
+    
+    def events():
+        for chunk in ai_generator.solve_doubt_stream(question, context):
+            yield b"data: " + orjson.dumps({'chunk': chunk}) + b"\n\n"
+        yield b"data: " + orjson.dumps({'done': True}) + b"\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        # identity encoding stops the compression middleware from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Content-Encoding': 'identity'}
+    )
+
 @app.route('/export', methods=['POST'])
 @login_required
 def export_content():
@@ -513,27 +1114,73 @@ def export_content():
         
         # Get content if ID provided
         if content_id:
-            content = GeneratedContent.query.get(content_id)
-            if not content:
+            content_data = load_generated_content(content_id)
+            if content_data is None:
                 return jsonify({'error': 'Content not found'}), 404
-            content_data = json.loads(content.content)
         
-        # Export based on format
-        file_path = export_manager.export(
+        if export_format not in MIME_TYPES:
+            return jsonify({'error': f'Unsupported format: {export_format}'}), 400
+        
+        download_name = f"edumentor_export.{FILE_EXTENSIONS[export_format]}"
+        
+        if app.config['EXPORT_ACCEL_REDIRECT']:
+            # Name the file after its content so repeat exports reuse the
+            # file already on disk instead of rendering it again
+            digest = hashlib.blake2b(orjson.dumps(content_data, option=orjson.OPT_SORT_KEYS),
+                                     digest_size=16).hexdigest()
+            filename = f"export_{digest}"
+            path = os.path.join(export_manager.exports_dir, f"{filename}.{FILE_EXTENSIONS[export_format]}")
+            if not os.path.exists(path):
+                path = export_manager.export(content=content_data, format_type=export_format, filename=filename)
+            
+            response = app.response_class(mimetype=MIME_TYPES[export_format])
+            response.headers['X-Accel-Redirect'] = (
+                app.config['EXPORT_ACCEL_REDIRECT'].rstrip('/') + '/' + os.path.basename(path)
+            )
+            response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+            return response
+        
+        # Export into memory and send it directly - no round trip through disk
+        buf = io.BytesIO()
+        export_manager.export(
             content=content_data,
             format_type=export_format,
-            filename=f"edumentor_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            fileobj=buf
         )
+        buf.seek(0)
         
         return send_file(
-            file_path,
+            buf,
+            mimetype=MIME_TYPES[export_format],
             as_attachment=True,
-            download_name=f"edumentor_export.{export_format}"
+            download_name=download_name
         )
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@cache.memoize(timeout=60)
+def progress_snapshot(user_id):
+    """Serialized progress response body for a user and its ETag"""
+    body = orjson.dumps({'success': True, 'progress': progress_tracker.get_progress(user_id=user_id)})
+    return hashlib.blake2b(body, digest_size=16).hexdigest(), body
+
+def progress_response(user_id):
+    """Progress JSON response - a matching If-None-Match gets a 304 without a body"""
+    etag, body = progress_snapshot(user_id)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return conditional_response(response)
+
+def valid_progress_entry(entry):
+    """Whether a progress update has a topic, a numeric score and a string difficulty"""
+    if not isinstance(entry, dict):
+        return False
+    topic, score = entry.get('topic'), entry.get('score', 0)
+    return (isinstance(topic, str) and bool(topic.strip())
+            and isinstance(score, (int, float)) and not isinstance(score, bool)
+            and isinstance(entry.get('difficulty', 'medium'), str))
+
 @app.route('/progress', methods=['GET', 'POST'])
 @login_required
 def handle_progress():
@@ -542,21 +1189,32 @@ def handle_progress():
     
     if request.method == 'GET':
         # Get progress for logged-in user
-        progress = progress_tracker.get_progress(user_id=user_id)
-        return jsonify({'success': True, 'progress': progress})
+        return progress_response(user_id)
     
     else:  # POST
         data = request.json
-        topic = data.get('topic')
-        score = data.get('score', 0)
-        difficulty = data.get('difficulty', 'medium')
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
-        progress_tracker.update_progress(
-            topic=topic,
-            score=score,
-            difficulty=difficulty,
-            user_id=user_id
-        )
+        # Rows are written in the background after this returns, so bad
+        # input has to be rejected here rather than by the database
+        if 'entries' in data:
+            # Several results at once (e.g. every topic of a finished session)
+            entries = data['entries']
+            if not isinstance(entries, list) or not all(valid_progress_entry(e) for e in entries):
+                return jsonify({'error': 'entries must be a list of objects with a topic and a numeric score'}), 400
+            progress_tracker.bulk_update_progress(entries, user_id=user_id)
+        else:
+            if not valid_progress_entry(data):
+                return jsonify({'error': 'A topic and a numeric score are required'}), 400
+            
+            progress_tracker.update_progress(
+                topic=data['topic'],
+                score=data.get('score', 0),
+                difficulty=data.get('difficulty', 'medium'),
+                user_id=user_id
+            )
+        cache.delete_memoized(progress_snapshot, user_id)
         
         return jsonify({'success': True})
 
@@ -564,20 +1222,15 @@ def handle_progress():
 @role_required('teacher', 'admin')
 def generate_lesson_plan():
     """Generate lesson plan for teachers - requires teacher or admin role"""
+    req = parse_request(request.get_data(), LessonPlanRequest)
     try:
-        data = request.json
-        topic = data.get('topic', '')
-        duration = data.get('duration', 60)  # minutes
-        grade_level = data.get('grade_level', 'middle')
-        
-        if not topic:
+        if not req.topic:
             return jsonify({'error': 'Topic is required'}), 400
         
-        lesson_plan = ai_generator.generate_lesson_plan(
-            topic=topic,
-            duration=duration,
-            grade_level=grade_level
-        )
+        if req.background:
+            return queue_job(_ai_generate_lesson_plan, req.topic, req.duration, req.grade_level)
+        
+        lesson_plan = _ai_generate_lesson_plan(req.topic, req.duration, req.grade_level)
         
         return jsonify({'success': True, 'lesson_plan': lesson_plan})
     
@@ -588,37 +1241,112 @@ def generate_lesson_plan():
 @role_required('teacher', 'admin')
 def generate_homework():
     """Generate homework assignments - requires teacher or admin role"""
+    req = parse_request(request.get_data(), HomeworkRequest)
     try:
-        data = request.json
-        topic = data.get('topic', '')
-        difficulty = data.get('difficulty', 'medium')
-        
-        if not topic:
+        if not req.topic:
             return jsonify({'error': 'Topic is required'}), 400
         
-        homework = ai_generator.generate_homework(
-            topic=topic,
-            difficulty=difficulty
-        )
+        if req.background:
+            return queue_job(_ai_generate_homework, req.topic, req.difficulty)
+        
+        homework = _ai_generate_homework(req.topic, req.difficulty)
         
         return jsonify({'success': True, 'homework': homework})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Poll the state of a background generation job - requires login"""
+    job = job_queue.status(job_id)
+    if not job or job.get('owner_id') != session.get('user_id'):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response = {'success': True, 'job_id': job_id, 'state': job['state']}
+    if job['state'] == 'SUCCESS':
+        response['result'] = job['result']
+    elif job['state'] == 'FAILURE':
+        response['error'] = job['error']
+    return jsonify(response)
+
 # Initialize database
-def create_tables():
-    """Create database tables and create default admin user"""
+def outdated_columns(inspector, table):
+    """Model columns the existing table lacks, or has without their server default"""
+    present = {column['name']: column for column in inspector.get_columns(table.name)}
+    return [
+        column.name for column in table.columns
+        if column.name not in present
+        or (column.server_default is not None and present[column.name]['default'] is None)
+    ]
+
+def rebuild_table(conn, inspector, table):
+    """
+    Recreate an existing table from its model and copy the rows across.
+    SQLite can't add a column with a non-constant default (server_default=now())
+    or change a column's default in place, so the table is renamed, recreated and refilled
+    """
+    old_name = f'_old_{table.name}'
+    old_columns = {column['name'] for column in inspector.get_columns(table.name)}
+    old_indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+    # legacy_alter_table keeps other tables' foreign keys pointing at the
+    # original name instead of following the rename to the old copy
+    conn.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+    conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    conn.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+    # The old indexes moved with the renamed table but keep their names
+    for name in old_indexes:
+        conn.exec_driver_sql(f'DROP INDEX "{name}"')
+    table.create(conn)
+    shared = ', '.join(f'"{column.name}"' for column in table.columns if column.name in old_columns)
+    conn.exec_driver_sql(f'INSERT INTO "{table.name}" ({shared}) SELECT {shared} FROM "{old_name}"')
+    conn.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+def upgrade_schema(inspector, tables):
+    """Bring existing tables up to date with the models - new columns and defaults, then new indexes"""
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        columns = outdated_columns(inspector, table)
+        if columns:
+            if db.engine.dialect.name != 'sqlite':
+                raise RuntimeError(
+                    f"Table '{table.name}' is missing or outdated columns {columns}; "
+                    f"migrate it by hand or run 'python app.py --reset' (deletes all data)")
+            print(f"Upgrading table '{table.name}' (columns: {', '.join(columns)})")
+            with db.engine.begin() as conn:
+                rebuild_table(conn, inspector, table)
+            # The rebuilt table was created with every index
+            continue
+        
+        # Indexes added to the models after a table was created
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(db.engine)
+
+def create_tables(reset=False):
+    """
+    Create missing database tables, upgrade outdated ones and create the default admin user
+    reset: drop and recreate every table first - WARNING: deletes all existing data!
+    """
     with app.app_context():
-        # Drop all existing tables and recreate them
-        # This ensures the schema is always up to date in development
-        # WARNING: This will delete all existing data!
-        db.drop_all()
-        db.create_all()
-        
-        # Create default admin user if it doesn't exist
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
+        if reset:
+            db.drop_all()
+        
+        # Only issue DDL when a table is actually missing or outdated, so
+        # restarts keep the existing data and warm caches
+        inspector = sa_inspect(db.engine)
+        existing = set(inspector.get_table_names())
+        if reset or not existing.issuperset(db.metadata.tables):
+            db.create_all()
+        if not reset:
+            upgrade_schema(inspector, existing)
+        
+        # Create default admin user if it doesn't exist - only the id is
+        # selected since we just need to know whether the row is there
+        if not db.session.query(User.id).filter_by(username='admin').first():
             admin = User(
                 username='admin',
                 email='admin@edumentor.ai',
@@ -630,8 +1358,8 @@ def create_tables():
             print("Default admin user created: username='admin', password='admin123'")
 
 if __name__ == '__main__':
-    # Create database tables on startup
-    create_tables()
+    # Create database tables on startup - pass --reset to start from an empty database
+    create_tables(reset='--reset' in sys.argv)
     
     app.run(debug=True, host='0.0.0.0', port=5000)
 
@@ -7,7 +7,171 @@ Uses Google Gemini API for AI functionality.
 
 import os
 import json
+import orjson
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+from requests.adapters import HTTPAdapter
+
+# Models by tier - the fast model answers most prompts, the quality model
+# is kept for long-form output (lesson plans, study notes)
+MODEL_NAMES = {
+    'fast': os.environ.get('GEMINI_FAST_MODEL', 'gemini-1.5-flash'),
+    'quality': os.environ.get('GEMINI_QUALITY_MODEL', 'gemini-1.5-pro')
+}
+# System instruction and sampling temperature used for every call. The
+# instruction is set on the model rather than prepended to each prompt,
+# so the API handles it as a stable prefix shared by every request
+SYSTEM_PREAMBLE = "You are an expert educational content creator."
+TEMPERATURE = 0.7
+
+# Process-wide LRU cache of API responses, keyed by a hash of everything
+# that determines the output. Identical prompts skip the network round trip
+RESPONSE_CACHE_SIZE = 1024
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+# Futures of the API calls currently running, by cache key (guarded by the same lock)
+_INFLIGHT = {}
+
+def _response_key(prompt, max_tokens, model_tier, json_output=False):
+    """Cache key for one API call"""
+    raw = json.dumps(
+        {'m': MODEL_NAMES[model_tier], 's': SYSTEM_PREAMBLE, 'p': prompt, 'mt': max_tokens, 't': TEMPERATURE,
+         'j': json_output},
+        sort_keys=True
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+# Output token budget per kind of content. Generation time grows with every
+# token produced, so each budget is sized to what the prompt asks for rather
+# than one generous limit for everything
+MAX_OUTPUT_TOKENS = {
+    'notes': 1500,
+    'summary': 400,
+    'diagram_description': 500,
+    'video_script': 1200,
+    'doubt': 800,
+    'lesson_plan': 1500,
+    'homework': 1200,
+}
+DEFAULT_MAX_TOKENS = 1000
+# Student-supplied context and scraped source text are cut to this many
+# characters before they go into a prompt
+MAX_CONTEXT_CHARS = 2000
+
+# Optional semantic cache (SEMANTIC_CACHE=1): near-duplicate prompts reuse a
+# response when their embeddings are at least this similar
+EMBEDDING_MODEL = 'models/text-embedding-004'
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.92))
+
+# Keep-alive connections kept open to the Gemini API. requests' default of
+# 10 is less than one fanned-out quiz under concurrent load, and every
+# connection over the limit is dropped and re-handshaken on the next call
+HTTP_POOL_SIZE = int(os.environ.get('GEMINI_HTTP_POOL_SIZE', 40))
+
+# Quizzes and flashcard decks are generated one item per request, with at
+# most FANOUT_CONCURRENCY requests in flight. Each item is steered to a
+# different aspect of the topic so the independent answers don't repeat
+FANOUT_CONCURRENCY = 10
+# Every item is a billed API call, so a quiz or deck is capped at this many
+MAX_FANOUT_ITEMS = 50
+QUESTION_MAX_TOKENS = 250
+FLASHCARD_MAX_TOKENS = 100
+QUESTION_ASPECTS = [
+    'definitions', 'key concepts', 'processes', 'facts', 'applications',
+    'examples', 'causes and effects', 'comparisons', 'history', 'common misconceptions'
+]
+
+# Prompt templates, filled in with str.format by the prompt builders below
+_PROMPTS = {
+    'notes': "Create comprehensive study notes on '{topic}' suitable for {difficulty} level students. Include key concepts, definitions, examples, and important points.",
+    'summary': "Create a concise summary of '{topic}' for {difficulty} level. Include main points and key takeaways.",
+    'diagram_description': "Describe a visual diagram or concept map for '{topic}' suitable for {difficulty} level. Include what elements should be shown and how they connect.",
+    'video_script': "Create an engaging video script for teaching '{topic}' to {difficulty} level students. Include introduction, main content, examples, and conclusion."
+}
+_PROMPT_TRANSLATE = " Translate the content to {language}."
+
+_PROMPT_QUIZ_QUESTION = """Create one multiple-choice quiz question about the specific topic: "{topic}"
+        This is question {number} of {total}. To avoid repeating the other questions,
+        focus on {aspect} of "{topic}".
+
+        The question must be:
+        - Directly about "{topic}" - no general knowledge questions
+        - Appropriate for {difficulty} difficulty level students
+        - Given exactly 4 plausible answer options, only one of them correct
+        - Followed by a clear explanation that references "{topic}"
+
+        Format as JSON with this exact structure:
+        {{"question": "A specific question about {topic}", "options": ["Option A", "Option B", "Option C", "Option D"], "correct": 0, "explanation": "Explanation that clearly connects the answer to {topic}"}}
+
+        Return ONLY valid JSON, no additional text before or after."""
+
+_PROMPT_FLASHCARD = """Create one flashcard on '{topic}'.
+        This is card {number} of {total} - focus on {aspect} of '{topic}'.
+        Format as JSON:
+        {{"front": "Question or term", "back": "Answer or definition"}}"""
+
+_PROMPT_DOUBT = """A student asks: "{question}"
+        {context}
+        
+        Provide a clear, educational explanation that helps the student understand.
+        Use simple language and include examples if helpful."""
+
+_PROMPT_LESSON_PLAN = """Create a detailed lesson plan for teaching '{topic}' to {grade_level} level students.
+        Duration: {duration} minutes.
+        
+        Include:
+        - Learning objectives
+        - Materials needed
+        - Step-by-step activities
+        - Assessment methods
+        - Homework suggestions"""
+
+_PROMPT_HOMEWORK = """Create homework assignments on '{topic}' for {difficulty} level students.
+        Include:
+        - Clear instructions
+        - Multiple question types (short answer, essay, problems)
+        - Expected completion time
+        - Answer key for teachers"""
+
+# Demo responses returned when no API key is configured
+_MOCK_QUIZ = json.dumps({
+    "questions": [
+        {
+            "question": "What is the main topic?",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correct": 0,
+            "explanation": "This is a sample explanation."
+        }
+    ]
+})
+_MOCK_FLASHCARDS = json.dumps({
+    "cards": [
+        {"front": "Question?", "back": "Answer"}
+    ]
+})
+_MOCK_DEFAULT = "This is a sample generated content. Please configure Gemini API key for full functionality."
+
+def clear_cache():
+    """Drop every cached API response"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE.clear()
+
+def truncate(text, limit=MAX_CONTEXT_CHARS):
+    """Cut text to at most limit characters, at a word boundary where possible"""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = cut.rfind(' ')
+    return (cut[:space] if space > limit // 2 else cut).rstrip() + '...'
+
+def _fanout_count(count):
+    """Number of quiz questions or flashcards to request, clamped to 1..MAX_FANOUT_ITEMS"""
+    return max(1, min(int(count), MAX_FANOUT_ITEMS))
 
 class AIGenerator:
     """Main class for generating AI-powered educational content"""
@@ -18,90 +182,214 @@ class AIGenerator:
         api_key = os.environ.get('GEMINI_API_KEY', '')
         if api_key:
             # Configure Gemini API with the provided key
-            genai.configure(api_key=api_key)
-            # Initialize the model (using gemini-pro for text generation)
-            self.model = genai.GenerativeModel('gemini-pro')
+            # REST transport goes through requests, which gevent can patch,
+            # unlike the default gRPC channel
+            genai.configure(api_key=api_key, transport='rest')
+            # Initialize one model per tier
+            self.models = {
+                tier: genai.GenerativeModel(name, system_instruction=SYSTEM_PREAMBLE)
+                for tier, name in MODEL_NAMES.items()
+            }
             self.api_available = True
+            self._http = self._configure_http_pool()
         else:
-            self.model = None
+            self.models = {}
             self.api_available = False
+            self._http = None
             print("Warning: Gemini API key not found. Using mock responses.")
+        
+        # Semantic caches are kept per scope (see _call_ai), so a response is
+        # only ever reused for a near-identical prompt of the same kind
+        self.semantic_caches = {} if self.api_available and os.environ.get('SEMANTIC_CACHE') == '1' else None
+    
+    def _configure_http_pool(self):
+        """
+        Size the keep-alive pool of the SDK's shared HTTP session
+        Every call goes through this one session, so TLS connections are
+        reused across requests. Returns the session, or None if the SDK
+        doesn't expose it
+        """
+        try:
+            session = genai_client.get_default_generative_client()._transport._session
+        except AttributeError:
+            return None
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+        return session
+    
+    def close(self):
+        """Close the pooled HTTP connections"""
+        if self._http is not None:
+            self._http.close()
     
-    def _call_ai(self, prompt, max_tokens=2000):
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _semantic_cache(self, scope):
+        """Semantic cache for a scope, or None when disabled or the call has no scope"""
+        if self.semantic_caches is None or scope is None:
+            return None
+        if scope not in self.semantic_caches:
+            # numpy is only needed when the semantic cache is turned on
+            from modules.semantic_cache import SemanticCache
+            self.semantic_caches[scope] = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+        return self.semantic_caches[scope]
+    
+    def _embed(self, prompt):
+        """Embedding of a prompt, or None if the embedding call fails"""
+        try:
+            return genai.embed_content(model=EMBEDDING_MODEL, content=prompt)['embedding']
+        except Exception as e:
+            print(f"Embedding API Error: {e}")
+            return None
+    
+    def _generation_config(self, max_tokens, json_output=False):
+        """Gemini generation config for one call"""
+        # Note: Gemini uses max_output_tokens instead of max_tokens
+        generation_config = {
+            "temperature": TEMPERATURE,
+            "max_output_tokens": max_tokens,
+        }
+        if json_output:
+            # Compact JSON with no markdown fence around it
+            generation_config["response_mime_type"] = "application/json"
+        return generation_config
+    
+    def _call_ai(self, prompt, max_tokens=DEFAULT_MAX_TOKENS, model_tier='fast', json_output=False,
+                 semantic_scope=None):
         """
         Call Gemini API or return mock response
         This is a helper method to handle AI calls
+        model_tier: 'fast' (default) or 'quality' for long-form content
+        json_output: ask the model for a bare JSON response
+        semantic_scope: hashable key naming the kind of free-form prompt this is;
+            only calls that pass one use the semantic cache, and only against
+            prompts with the same scope. Templated prompts differ in just a topic
+            or an item number, which embeddings can't tell apart reliably
         """
-        if not self.api_available or not self.model:
+        model = self.models.get(model_tier)
+        if not self.api_available or not model:
             # Return mock response for demo purposes
             return self._get_mock_response(prompt)
         
+        key = _response_key(prompt, max_tokens, model_tier, json_output)
+        with _RESPONSE_CACHE_LOCK:
+            if key in _RESPONSE_CACHE:
+                _RESPONSE_CACHE.move_to_end(key)
+                return _RESPONSE_CACHE[key]
+            # Singleflight: if the same call is already running in another
+            # thread, wait for its answer instead of making a second one
+            inflight = _INFLIGHT.get(key)
+            if inflight is None:
+                _INFLIGHT[key] = future = Future()
+        if inflight is not None:
+            return inflight.result()
+        
+        try:
+            text = self._fetch_ai(model, prompt, max_tokens, json_output, key, semantic_scope)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _RESPONSE_CACHE_LOCK:
+                del _INFLIGHT[key]
+    
+    def _fetch_ai(self, model, prompt, max_tokens, json_output, key, semantic_scope=None):
+        """Answer a _call_ai cache miss from the semantic cache or the API, and cache the result"""
+        semantic_cache = self._semantic_cache(semantic_scope)
+        embedding = self._embed(prompt) if semantic_cache else None
+        if embedding is not None:
+            cached = semantic_cache.lookup(embedding)
+            if cached is not None:
+                return cached
+        
         try:
-            # Build the full prompt with system instruction
-            full_prompt = f"You are an expert educational content creator. {prompt}"
-            
             # Generate content using Gemini API
-            # Note: Gemini uses max_output_tokens instead of max_tokens
-            generation_config = {
-                "temperature": 0.7,
-                "max_output_tokens": max_tokens,
-            }
-            
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config
+            response = model.generate_content(
+                prompt,
+                generation_config=self._generation_config(max_tokens, json_output)
             )
-            
-            # Return the generated text
-            return response.text
+            text = response.text
         except Exception as e:
             print(f"AI API Error: {e}")
+            # Fallback mock responses are not cached, so the next call retries the API
             return self._get_mock_response(prompt)
+        
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[key] = text
+            if len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+                _RESPONSE_CACHE.popitem(last=False)
+        if embedding is not None:
+            semantic_cache.add(embedding, text)
+        
+        # Return the generated text
+        return text
+
+    
+    def _call_ai_stream(self, prompt, max_tokens=DEFAULT_MAX_TOKENS, model_tier='fast'):
+        """
+        Call Gemini API with streaming enabled
+        Yields text chunks as they are generated, or the mock response as a single chunk
+        """
+        model = self.models.get(model_tier)
+        if not self.api_available or not model:
+            yield self._get_mock_response(prompt)
+            return
+        
+        sent_any = False
+        try:
+            response = model.generate_content(
+                prompt,
+                generation_config=self._generation_config(max_tokens),
+                stream=True
+            )
+            for chunk in response:
+                if chunk.text:
+                    sent_any = True
+                    yield chunk.text
+        except Exception as e:
+            print(f"AI API Error: {e}")
+            # Only fall back if nothing reached the client yet
+            if not sent_any:
+                yield self._get_mock_response(prompt)
+    
+    async def _call_ai_async(self, prompt, max_tokens=DEFAULT_MAX_TOKENS, model_tier='fast', json_output=False,
+                             semantic_scope=None):
+        """
+        Awaitable version of _call_ai
+        The blocking SDK call runs in a worker thread: async views get a fresh
+        event loop per request, which the SDK's loop-bound async client can't share
+        """
+        return await asyncio.to_thread(self._call_ai, prompt, max_tokens, model_tier, json_output, semantic_scope)
     
     def _get_mock_response(self, prompt):
         """Generate mock responses when API is not available"""
         # This provides demo functionality without API key
-        if "quiz" in prompt.lower():
-            return json.dumps({
-                "questions": [
-                    {
-                        "question": "What is the main topic?",
-                        "options": ["Option A", "Option B", "Option C", "Option D"],
-                        "correct": 0,
-                        "explanation": "This is a sample explanation."
-                    }
-                ]
-            })
-        elif "flashcard" in prompt.lower():
-            return json.dumps({
-                "cards": [
-                    {"front": "Question?", "back": "Answer"}
-                ]
-            })
+        lowered = prompt.lower()
+        if "quiz" in lowered:
+            return _MOCK_QUIZ
+        elif "flashcard" in lowered:
+            return _MOCK_FLASHCARDS
         else:
-            return "This is a sample generated content. Please configure Gemini API key for full functionality."
+            return _MOCK_DEFAULT
     
-    def generate(self, topic, content_type='notes', difficulty='medium', language='en'):
-        """
-        Generate content based on type
-        content_type can be: notes, summary, diagram_description, video_script
-        """
+    def _generate_prompt(self, topic, content_type='notes', difficulty='medium', language='en'):
+        """Build the prompt used by generate"""
         # Build prompt based on content type
-        prompts = {
-            'notes': f"Create comprehensive study notes on '{topic}' suitable for {difficulty} level students. Include key concepts, definitions, examples, and important points.",
-            'summary': f"Create a concise summary of '{topic}' for {difficulty} level. Include main points and key takeaways.",
-            'diagram_description': f"Describe a visual diagram or concept map for '{topic}' suitable for {difficulty} level. Include what elements should be shown and how they connect.",
-            'video_script': f"Create an engaging video script for teaching '{topic}' to {difficulty} level students. Include introduction, main content, examples, and conclusion."
-        }
-        
-        prompt = prompts.get(content_type, prompts['notes'])
+        prompt = _PROMPTS.get(content_type, _PROMPTS['notes']).format(topic=topic, difficulty=difficulty)
         
         # Add language instruction if not English
         if language != 'en':
-            prompt += f" Translate the content to {language}."
-        
-        result = self._call_ai(prompt)
+            prompt += _PROMPT_TRANSLATE.format(language=language)
         
+        return prompt
+    
+    def _format_generated(self, result, topic, content_type, difficulty):
+        """Shape the AI output of generate for its content type"""
         # Format result based on content type
         if content_type == 'notes':
             return {
@@ -134,141 +422,217 @@ class AIGenerator:
         
         return {'type': content_type, 'content': result}
     
-    def generate_quiz(self, topic, num_questions=10, difficulty='medium'):
+    def _generate_tier(self, content_type):
+        """Model tier for a generate content type - comprehensive notes need the quality model"""
+        return 'quality' if content_type == 'notes' else 'fast'
+    
+    def _generate_max_tokens(self, content_type):
+        """Output token budget for a generate content type"""
+        return MAX_OUTPUT_TOKENS.get(content_type, DEFAULT_MAX_TOKENS)
+    
+    def generate(self, topic, content_type='notes', difficulty='medium', language='en'):
         """
-        Generate quiz with multiple choice questions related to the given topic
-        Creates questions that are directly relevant to the topic provided by the user
+        Generate content based on type
+        content_type can be: notes, summary, diagram_description, video_script
         """
-        # Enhanced prompt to generate topic-specific quiz questions
-        # The topic is emphasized multiple times to ensure questions are strictly related to it
-        prompt = f"""You are creating a quiz about the specific topic: "{topic}"
-
-        CRITICAL REQUIREMENT: Every single question MUST be directly and specifically about "{topic}". 
-        Do NOT create general knowledge questions. Every question must relate to "{topic}".
-
-        Create exactly {num_questions} multiple-choice questions that are:
-        1. Directly about the topic: "{topic}"
-        2. Testing knowledge and understanding of "{topic}" specifically
-        3. Covering different aspects, concepts, and details of "{topic}"
-        4. Appropriate for {difficulty} difficulty level students
-        5. Each with exactly 4 answer options (A, B, C, D)
-        6. Including clear explanations that reference "{topic}"
-
-        Question Requirements:
-        - Each question must mention or clearly relate to "{topic}"
-        - Questions should explore: definitions, concepts, processes, facts, applications, or examples related to "{topic}"
-        - Options should be plausible but only one should be correct
-        - Explanations must explain why the answer is correct in the context of "{topic}"
-
-        Format as JSON with this exact structure:
-        {{
-            "questions": [
-                {{
-                    "question": "A specific question about {topic}",
-                    "options": ["Option A related to {topic}", "Option B related to {topic}", "Option C related to {topic}", "Option D related to {topic}"],
-                    "correct": 0,
-                    "explanation": "Explanation that clearly connects the answer to {topic}"
-                }}
-            ]
-        }}
-        
-        Remember: ALL questions must be about "{topic}" - no generic questions allowed.
-        Return ONLY valid JSON, no additional text before or after."""
+        result = self._call_ai(self._generate_prompt(topic, content_type, difficulty, language),
+                               max_tokens=self._generate_max_tokens(content_type),
+                               model_tier=self._generate_tier(content_type))
+        return self._format_generated(result, topic, content_type, difficulty)
+    
+    async def agenerate(self, topic, content_type='notes', difficulty='medium', language='en'):
+        """Async version of generate"""
+        result = await self._call_ai_async(self._generate_prompt(topic, content_type, difficulty, language),
+                                           max_tokens=self._generate_max_tokens(content_type),
+                                           model_tier=self._generate_tier(content_type))
+        return self._format_generated(result, topic, content_type, difficulty)
+    
+    def generate_stream(self, topic, content_type='notes', difficulty='medium', language='en'):
+        """Generate content based on type, yielding the raw text in chunks as it is generated"""
+        yield from self._call_ai_stream(self._generate_prompt(topic, content_type, difficulty, language),
+                                        max_tokens=self._generate_max_tokens(content_type),
+                                        model_tier=self._generate_tier(content_type))
+    
+    def _call_ai_many(self, prompts, max_tokens=DEFAULT_MAX_TOKENS):
+        """Run independent JSON prompts concurrently and return their results in order"""
+        if len(prompts) <= 1:
+            return [self._call_ai(prompt, max_tokens, json_output=True) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(len(prompts), FANOUT_CONCURRENCY)) as pool:
+            return list(pool.map(lambda prompt: self._call_ai(prompt, max_tokens, json_output=True), prompts))
+    
+    async def _call_ai_many_async(self, prompts, max_tokens=DEFAULT_MAX_TOKENS):
+        """Async version of _call_ai_many"""
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
         
-        result = self._call_ai(prompt, max_tokens=4000)
+        async def call(prompt):
+            async with semaphore:
+                return await self._call_ai_async(prompt, max_tokens, json_output=True)
         
-        # Try to parse JSON, with better error handling
-        try:
-            # Clean the result - remove any markdown code blocks if present
-            cleaned_result = result.strip()
-            if cleaned_result.startswith('```'):
-                # Remove markdown code blocks
-                lines = cleaned_result.split('\n')
-                cleaned_result = '\n'.join(lines[1:-1]) if lines[-1].strip() == '```' else '\n'.join(lines[1:])
-            
-            # Parse JSON
-            quiz_data = json.loads(cleaned_result)
-            
-            # Validate structure
-            if not isinstance(quiz_data, dict) or 'questions' not in quiz_data:
-                raise ValueError("Invalid quiz structure")
-            
-            # Ensure we have questions
-            if not quiz_data.get('questions') or len(quiz_data['questions']) == 0:
-                raise ValueError("No questions generated")
-            
-            return quiz_data
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            print(f"Error parsing quiz JSON: {e}")
-            print(f"Raw response: {result[:200]}...")  # Print first 200 chars for debugging
+        return await asyncio.gather(*(call(prompt) for prompt in prompts))
+    
+    def _extract_json(self, result):
+        """
+        Cut the JSON object out of an AI answer
+        Drops a markdown code fence or any text the model put before or after it
+        """
+        start = result.find('{')
+        end = result.rfind('}')
+        if start == -1 or end < start:
+            return result
+        return result[start:end + 1]
+    
+    def _parse_items(self, results, list_key, required_key):
+        """
+        Collect the items from several single-item JSON answers
+        Each answer may be the item itself or {list_key: [items]}; answers
+        that don't parse are skipped and repeated items are dropped
+        """
+        items = []
+        seen = set()
+        for result in results:
+            try:
+                data = orjson.loads(self._extract_json(result))
+            except orjson.JSONDecodeError as e:
+                print(f"Error parsing {list_key} JSON: {e}")
+                print(f"Raw response: {result[:200]}...")  # Print first 200 chars for debugging
+                continue
             
-            # Fallback: return a structured format with a sample question
-            return {
-                'questions': [
-                    {
-                        'question': f"What is a key concept related to {topic}?",
-                        'options': [
-                            f'Option A related to {topic}',
-                            f'Option B related to {topic}',
-                            f'Option C related to {topic}',
-                            f'Option D related to {topic}'
-                        ],
-                        'correct': 0,
-                        'explanation': f'This is a sample question about {topic}. Please check your API configuration for full functionality.'
-                    }
-                ]
-            }
+            candidates = data.get(list_key, []) if isinstance(data, dict) and list_key in data else [data]
+            for item in candidates:
+                if isinstance(item, dict) and item.get(required_key) and item[required_key] not in seen:
+                    seen.add(item[required_key])
+                    items.append(item)
+        return items
     
-    def generate_flashcards(self, topic, num_cards=20):
-        """Generate flashcards for a topic"""
-        prompt = f"""Create {num_cards} flashcards on '{topic}'.
-        Format as JSON:
-        {{
-            "cards": [
-                {{"front": "Question or term", "back": "Answer or definition"}}
-            ]
-        }}"""
-        
-        result = self._call_ai(prompt, max_tokens=2000)
+    def _quiz_question_prompts(self, topic, num_questions=10, difficulty='medium'):
+        """Build one prompt per quiz question, each steered to a different aspect of the topic"""
+        num_questions = _fanout_count(num_questions)
+        return [
+            _PROMPT_QUIZ_QUESTION.format(topic=topic, number=i + 1, total=num_questions, difficulty=difficulty,
+                                         aspect=QUESTION_ASPECTS[i % len(QUESTION_ASPECTS)])
+            for i in range(num_questions)
+        ]
+    
+    def _assemble_quiz(self, results, topic):
+        """Assemble the quiz from the per-question answers, falling back to a sample question"""
+        questions = self._parse_items(results, 'questions', 'question')
+        if questions:
+            return {'questions': questions}
         
-        try:
-            return json.loads(result)
-        except:
-            return {
-                'cards': [
-                    {'front': f'What is {topic}?', 'back': f'Definition of {topic}'}
-                ]
-            }
+        # Fallback: return a structured format with a sample question
+        return {
+            'questions': [
+                {
+                    'question': f"What is a key concept related to {topic}?",
+                    'options': [
+                        f'Option A related to {topic}',
+                        f'Option B related to {topic}',
+                        f'Option C related to {topic}',
+                        f'Option D related to {topic}'
+                    ],
+                    'correct': 0,
+                    'explanation': f'This is a sample question about {topic}. Please check your API configuration for full functionality.'
+                }
+            ]
+        }
+    
+    def generate_quiz(self, topic, num_questions=10, difficulty='medium'):
+        """
+        Generate quiz with multiple choice questions related to the given topic
+        Each question is a separate short request and they all run concurrently,
+        so the quiz takes about as long as its slowest question, and one
+        malformed answer only costs that question
+        """
+        prompts = self._quiz_question_prompts(topic, num_questions, difficulty)
+        return self._assemble_quiz(self._call_ai_many(prompts, max_tokens=QUESTION_MAX_TOKENS), topic)
+    
+    async def agenerate_quiz(self, topic, num_questions=10, difficulty='medium'):
+        """Async version of generate_quiz"""
+        prompts = self._quiz_question_prompts(topic, num_questions, difficulty)
+        return self._assemble_quiz(await self._call_ai_many_async(prompts, max_tokens=QUESTION_MAX_TOKENS), topic)
+    
+    def _flashcard_prompts(self, topic, num_cards=20):
+        """Build one prompt per flashcard, each steered to a different aspect of the topic"""
+        num_cards = _fanout_count(num_cards)
+        return [
+            _PROMPT_FLASHCARD.format(topic=topic, number=i + 1, total=num_cards,
+                                     aspect=QUESTION_ASPECTS[i % len(QUESTION_ASPECTS)])
+            for i in range(num_cards)
+        ]
+    
+    def _assemble_flashcards(self, results, topic):
+        """Assemble the flashcards from the per-card answers, falling back to a sample card"""
+        cards = self._parse_items(results, 'cards', 'front')
+        if cards:
+            return {'cards': cards}
+        return {
+            'cards': [
+                {'front': f'What is {topic}?', 'back': f'Definition of {topic}'}
+            ]
+        }
+    
+    def generate_flashcards(self, topic, num_cards=20):
+        """Generate flashcards for a topic - one concurrent request per card"""
+        prompts = self._flashcard_prompts(topic, num_cards)
+        return self._assemble_flashcards(self._call_ai_many(prompts, max_tokens=FLASHCARD_MAX_TOKENS), topic)
+    
+    async def agenerate_flashcards(self, topic, num_cards=20):
+        """Async version of generate_flashcards"""
+        prompts = self._flashcard_prompts(topic, num_cards)
+        return self._assemble_flashcards(await self._call_ai_many_async(prompts, max_tokens=FLASHCARD_MAX_TOKENS), topic)
+    
+    def _doubt_prompt(self, question, context=''):
+        """Build the prompt used for doubt solving"""
+        return _PROMPT_DOUBT.format(question=question, context=f"Context: {truncate(context)}" if context else "")
+    
+    def _doubt_scope(self, context=''):
+        """Semantic cache scope for a doubt - differently worded questions asked in the same context"""
+        return ('doubt', truncate(context).strip().lower())
     
     def solve_doubt(self, question, context=''):
         """Solve student doubts using AI"""
-        prompt = f"""A student asks: "{question}"
-        {f"Context: {context}" if context else ""}
-        
-        Provide a clear, educational explanation that helps the student understand.
-        Use simple language and include examples if helpful."""
-        
-        answer = self._call_ai(prompt)
+        answer = self._call_ai(self._doubt_prompt(question, context), max_tokens=MAX_OUTPUT_TOKENS['doubt'],
+                               semantic_scope=self._doubt_scope(context))
         return {
             'question': question,
             'answer': answer,
             'context': context
         }
     
+    async def asolve_doubt(self, question, context=''):
+        """Async version of solve_doubt"""
+        answer = await self._call_ai_async(self._doubt_prompt(question, context), max_tokens=MAX_OUTPUT_TOKENS['doubt'],
+                                           semantic_scope=self._doubt_scope(context))
+        return {
+            'question': question,
+            'answer': answer,
+            'context': context
+        }
+    
+    def solve_doubt_stream(self, question, context=''):
+        """Solve student doubts using AI, yielding the answer in chunks as it is generated"""
+        yield from self._call_ai_stream(self._doubt_prompt(question, context), max_tokens=MAX_OUTPUT_TOKENS['doubt'])
+    
+    def _lesson_plan_prompt(self, topic, duration=60, grade_level='middle'):
+        """Build the prompt used by generate_lesson_plan"""
+        return _PROMPT_LESSON_PLAN.format(topic=topic, grade_level=grade_level, duration=duration)
+    
     def generate_lesson_plan(self, topic, duration=60, grade_level='middle'):
         """Generate lesson plan for teachers"""
-        prompt = f"""Create a detailed lesson plan for teaching '{topic}' to {grade_level} level students.
-        Duration: {duration} minutes.
-        
-        Include:
-        - Learning objectives
-        - Materials needed
-        - Step-by-step activities
-        - Assessment methods
-        - Homework suggestions"""
+        result = self._call_ai(self._lesson_plan_prompt(topic, duration, grade_level),
+                               max_tokens=MAX_OUTPUT_TOKENS['lesson_plan'], model_tier='quality')
         
-        result = self._call_ai(prompt, max_tokens=2500)
+        return {
+            'topic': topic,
+            'duration': duration,
+            'grade_level': grade_level,
+            'plan': result
+        }
+    
+    async def agenerate_lesson_plan(self, topic, duration=60, grade_level='middle'):
+        """Async version of generate_lesson_plan"""
+        result = await self._call_ai_async(self._lesson_plan_prompt(topic, duration, grade_level),
+                                           max_tokens=MAX_OUTPUT_TOKENS['lesson_plan'], model_tier='quality')
         
         return {
             'topic': topic,
@@ -277,16 +641,23 @@ class AIGenerator:
             'plan': result
         }
     
+    def _homework_prompt(self, topic, difficulty='medium'):
+        """Build the prompt used by generate_homework"""
+        return _PROMPT_HOMEWORK.format(topic=topic, difficulty=difficulty)
+    
     def generate_homework(self, topic, difficulty='medium'):
         """Generate homework assignments"""
-        prompt = f"""Create homework assignments on '{topic}' for {difficulty} level students.
-        Include:
-        - Clear instructions
-        - Multiple question types (short answer, essay, problems)
-        - Expected completion time
-        - Answer key for teachers"""
+        result = self._call_ai(self._homework_prompt(topic, difficulty), max_tokens=MAX_OUTPUT_TOKENS['homework'])
         
-        result = self._call_ai(prompt, max_tokens=2000)
+        return {
+            'topic': topic,
+            'difficulty': difficulty,
+            'homework': result
+        }
+    
+    async def agenerate_homework(self, topic, difficulty='medium'):
+        """Async version of generate_homework"""
+        result = await self._call_ai_async(self._homework_prompt(topic, difficulty), max_tokens=MAX_OUTPUT_TOKENS['homework'])
         
         return {
             'topic': topic,
@@ -294,3 +665,15 @@ class AIGenerator:
             'homework': result
         }
 
+
+_instance = None
+_instance_lock = threading.Lock()
+
+def get_generator():
+    """Process-wide AIGenerator, created on first use so every caller shares its models and connection pool"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = AIGenerator()
+    return _instance
@@ -4,78 +4,157 @@ Handles exporting content to various formats: PDF, PPT, DOCX
 """
 
 import os
-from datetime import datetime
-from docx import Document
-from pptx import Presentation
-from pptx.util import Inches
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+import re
+import tempfile
+import time
 import json
 
+# docx, pptx and reportlab are imported inside the exporters that use them:
+# they are slow to import and most processes never export every format
+
+# Content types and file extensions for each supported export format
+MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'ppt': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+FILE_EXTENSIONS = {
+    'pdf': 'pdf',
+    'ppt': 'pptx',
+    'docx': 'docx'
+}
+
+# Paragraph and line-break tags in AI output - <p> is dropped, </p> and
+# <br> become line breaks
+_PDF_TAG_RE = re.compile(r'</?p>|<br\s*/?>')
+
+def _pdf_tag_replacement(match):
+    """Replacement text for one _PDF_TAG_RE match"""
+    return '' if match.group() == '<p>' else '\n'
+
 class ExportManager:
     """Manages exporting content to different file formats"""
     
+    # reportlab sample stylesheet, built on first PDF export and shared -
+    # exports only read from it
+    _STYLES = None
+    
+    @classmethod
+    def _styles(cls):
+        """Shared PDF paragraph styles"""
+        if cls._STYLES is None:
+            from reportlab.lib.styles import getSampleStyleSheet
+            cls._STYLES = getSampleStyleSheet()
+        return cls._STYLES
+    
     def __init__(self):
         """Initialize export manager"""
-        # Create exports directory if it doesn't exist
+        # Created on the first export written to disk (see _ensure_dir)
         self.exports_dir = 'exports'
-        if not os.path.exists(self.exports_dir):
-            os.makedirs(self.exports_dir)
     
-    def export(self, content, format_type='pdf', filename='export'):
+    def _ensure_dir(self):
+        """Create the exports directory if it doesn't exist"""
+        os.makedirs(self.exports_dir, exist_ok=True)
+    
+    def export(self, content, format_type='pdf', filename='export', fileobj=None):
         """
         Export content to specified format
         format_type: 'pdf', 'ppt', 'docx'
+        fileobj: optional binary file-like object (e.g. BytesIO) to write into
+        instead of a file in the exports directory
+        Returns the file path, or fileobj when one was given
         """
         if format_type == 'pdf':
-            return self._export_pdf(content, filename)
+            exporter = self._export_pdf
         elif format_type == 'ppt':
-            return self._export_ppt(content, filename)
+            exporter = self._export_ppt
         elif format_type == 'docx':
-            return self._export_docx(content, filename)
+            exporter = self._export_docx
         else:
             raise ValueError(f"Unsupported format: {format_type}")
-    
-    def _export_pdf(self, content, filename):
-        """Export content to PDF"""
-        filepath = os.path.join(self.exports_dir, f"{filename}.pdf")
         
-        # Create PDF document
-        doc = SimpleDocTemplate(filepath, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
+        if fileobj is not None:
+            return exporter(content, filename, fileobj)
+        
+        # Write to a temporary file and rename it into place, so the export
+        # path never holds a partly written file - even if the export fails
+        # or another request is writing the same file
+        path = self._target(filename, format_type, None)
+        fd, tmp_path = tempfile.mkstemp(dir=self.exports_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                exporter(content, filename, tmp)
+            # mkstemp creates the file owner-only; exports may be served by nginx
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return path
+    
+    def _target(self, filename, format_type, fileobj):
+        """Return where an exporter should write: fileobj if given, else a path"""
+        if fileobj is not None:
+            return fileobj
+        self._ensure_dir()
+        return os.path.join(self.exports_dir, f"{filename}.{FILE_EXTENSIONS[format_type]}")
+    
+    def _iter_paragraphs(self, text):
+        """Yield the non-empty, stripped paragraphs of text (separated by blank lines) one at a time"""
+        start = 0
+        while start <= len(text):
+            end = text.find('\n\n', start)
+            if end == -1:
+                end = len(text)
+            para = text[start:end].strip()
+            if para:
+                yield para
+            start = end + 2
+    
+    def _pdf_flowables(self, content, styles):
+        """Yield the PDF flowables for content, paragraph by paragraph"""
+        from reportlab.platypus import Paragraph, Spacer
         
         # Extract content based on type
         if isinstance(content, dict):
             # Add title
             title = content.get('topic', 'Educational Content')
-            story.append(Paragraph(title, styles['Title']))
-            story.append(Spacer(1, 12))
+            yield Paragraph(title, styles['Title'])
+            yield Spacer(1, 12)
             
             # Add content
             content_text = content.get('content', content.get('script', content.get('description', str(content))))
-            # Clean HTML tags if present
-            content_text = content_text.replace('<p>', '').replace('</p>', '\n')
-            content_text = content_text.replace('<br>', '\n')
+            # Clean HTML tags if present, in a single pass
+            content_text = _PDF_TAG_RE.sub(_pdf_tag_replacement, content_text)
             
-            # Split into paragraphs
-            paragraphs = content_text.split('\n\n')
-            for para in paragraphs:
-                if para.strip():
-                    story.append(Paragraph(para.strip(), styles['Normal']))
-                    story.append(Spacer(1, 6))
+            # Split into paragraphs without building the whole list of them
+            for para in self._iter_paragraphs(content_text):
+                yield Paragraph(para, styles['Normal'])
+                yield Spacer(1, 6)
         else:
             # Simple text content
-            story.append(Paragraph(str(content), styles['Normal']))
+            yield Paragraph(str(content), styles['Normal'])
+    
+    def _export_pdf(self, content, filename, fileobj=None):
+        """Export content to PDF"""
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate
+        
+        target = self._target(filename, 'pdf', fileobj)
+        
+        # Create PDF document
+        doc = SimpleDocTemplate(target, pagesize=letter)
+        styles = self._styles()
         
-        # Build PDF
-        doc.build(story)
-        return filepath
+        # Build PDF - reportlab's builder takes the story as a list
+        doc.build(list(self._pdf_flowables(content, styles)))
+        return target
     
-    def _export_ppt(self, content, filename):
+    def _export_ppt(self, content, filename, fileobj=None):
         """Export content to PowerPoint"""
-        filepath = os.path.join(self.exports_dir, f"{filename}.pptx")
+        from pptx import Presentation
+        
+        target = self._target(filename, 'ppt', fileobj)
         
         # Create presentation
         prs = Presentation()
@@ -95,30 +174,30 @@ class ExportManager:
         subtitle = slide.placeholders[1]
         
         title_shape.text = title
-        subtitle.text = f"Generated on {datetime.now().strftime('%Y-%m-%d')}"
+        subtitle.text = f"Generated on {time.strftime('%Y-%m-%d')}"
         
         # Content slides
-        # Split content into chunks for multiple slides
-        chunks = content_text.split('\n\n')
-        for chunk in chunks:
-            if chunk.strip():
-                bullet_slide_layout = prs.slide_layouts[1]
-                slide = prs.slides.add_slide(bullet_slide_layout)
-                shapes = slide.shapes
-                
-                title_shape = shapes.title
-                body_shape = shapes.placeholders[1]
-                
-                title_shape.text = "Content"
-                tf = body_shape.text_frame
-                tf.text = chunk.strip()
-        
-        prs.save(filepath)
-        return filepath
+        # One slide per paragraph, walked without splitting the text up front
+        bullet_slide_layout = prs.slide_layouts[1]
+        for chunk in self._iter_paragraphs(content_text):
+            slide = prs.slides.add_slide(bullet_slide_layout)
+            shapes = slide.shapes
+            
+            title_shape = shapes.title
+            body_shape = shapes.placeholders[1]
+            
+            title_shape.text = "Content"
+            tf = body_shape.text_frame
+            tf.text = chunk
+        
+        prs.save(target)
+        return target
     
-    def _export_docx(self, content, filename):
+    def _export_docx(self, content, filename, fileobj=None):
         """Export content to Word document"""
-        filepath = os.path.join(self.exports_dir, f"{filename}.docx")
+        from docx import Document
+        
+        target = self._target(filename, 'docx', fileobj)
         
         # Create document
         doc = Document()
@@ -142,6 +221,6 @@ class ExportManager:
                 doc.add_paragraph(para.strip())
         
         # Save document
-        doc.save(filepath)
-        return filepath
+        doc.save(target)
+        return target
 
@@ -0,0 +1,26 @@
+"""
+HTTP Session Module
+Shared requests sessions for the internet fetchers. A session keeps
+TCP/TLS connections to a host alive between calls, so repeated lookups
+skip the handshake, and retries transient failures with a short backoff.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'EduMentor/1.0'
+
+def create_session(pool_maxsize=10, retries=2):
+    """
+    Create a keep-alive session with retries
+    pool_maxsize: connections kept open per host
+    retries: attempts after the first on connection errors and 429/5xx responses
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
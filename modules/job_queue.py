@@ -0,0 +1,66 @@
+"""
+Job Queue Module
+Runs slow work (LLM calls, internet fetches) in background threads so the
+request thread can return immediately with a job id the client polls.
+Job state is kept in the app cache, so any worker sharing the cache backend
+(e.g. Redis) can answer status requests.
+"""
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class JobQueue:
+    """Executes jobs in a thread pool and tracks their state"""
+    
+    def __init__(self, app, cache, max_workers=4, result_timeout=3600):
+        """
+        Initialize job queue
+        app: Flask app - jobs run inside its application context
+        cache: Flask-Caching instance used to store job state
+        result_timeout: seconds a finished job's result is kept
+        """
+        self.app = app
+        self.cache = cache
+        self.result_timeout = result_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='edumentor-job')
+    
+    def _key(self, job_id):
+        """Cache key holding the state of a job"""
+        return f"job:{job_id}"
+    
+    def _set_state(self, job_id, owner_id, state, **extra):
+        """Store the current state of a job"""
+        self.cache.set(
+            self._key(job_id),
+            {'state': state, 'owner_id': owner_id, **extra},
+            timeout=self.result_timeout
+        )
+    
+    def submit(self, func, *args, owner_id=None, **kwargs):
+        """
+        Queue func(*args, **kwargs) for background execution
+        owner_id: id of the user allowed to read the result
+        Returns the job id
+        """
+        job_id = uuid.uuid4().hex
+        self._set_state(job_id, owner_id, 'PENDING')
+        self.executor.submit(self._run, job_id, owner_id, func, args, kwargs)
+        return job_id
+    
+    def _run(self, job_id, owner_id, func, args, kwargs):
+        """Execute a job inside the application context and record its outcome"""
+        with self.app.app_context():
+            self._set_state(job_id, owner_id, 'STARTED')
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self._set_state(job_id, owner_id, 'FAILURE', error=str(e))
+            else:
+                self._set_state(job_id, owner_id, 'SUCCESS', result=result)
+    
+    def status(self, job_id):
+        """
+        Get the state of a job
+        Returns dict with 'state', 'owner_id' and 'result' or 'error', or None if unknown/expired
+        """
+        return self.cache.get(self._key(job_id))
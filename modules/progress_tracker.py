@@ -3,21 +3,46 @@ Progress Tracker Module
 Tracks user progress, scores, and adaptive learning difficulty
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 import json
+import threading
+import time
+from sqlalchemy import func, insert, select
+
+# Seconds a computed adaptive difficulty is reused before it is recomputed
+ADAPTIVE_CACHE_TTL = 30
 
 class ProgressTracker:
     """Tracks and manages user learning progress"""
     
-    def __init__(self, db, progress_model=None):
-        """Initialize progress tracker with database and Progress model"""
+    def __init__(self, db, progress_model=None, write_buffer=None):
+        """
+        Initialize progress tracker with database and Progress model
+        write_buffer: optional WriteBuffer - updates are then batched in the background
+        """
         self.db = db
         self.Progress = progress_model  # Store the model class
+        self.write_buffer = write_buffer
+        # (user_id, topic) -> (computed at, difficulty)
+        self._adaptive_cache = {}
+        self._adaptive_lock = threading.Lock()
     
-    def update_progress(self, topic, score, difficulty='medium', user_id=1):
+    def _progress_values(self, topic, score, difficulty, user_id):
+        """Column values for one Progress row"""
+        # Note: Progress model uses 'difficulty_level' field name
+        return dict(
+            user_id=user_id,
+            topic=topic,
+            difficulty_level=difficulty,  # Map 'difficulty' parameter to 'difficulty_level' field
+            score=score,
+            data=json.dumps({'last_updated': datetime.now(timezone.utc).isoformat()})
+        )
+    
+    def update_progress(self, topic, score, difficulty='medium', user_id=1, commit=True):
         """
         Update user progress for a topic
         user_id defaults to 1 for demo purposes
+        commit: set to False to leave committing to the caller
         """
         # Use the Progress model passed during initialization
         if not self.Progress:
@@ -26,18 +51,50 @@ class ProgressTracker:
             self.Progress = ProgressModel
         
         # Create or update progress entry
-        # Note: Progress model uses 'difficulty_level' field name
-        progress = self.Progress(
-            user_id=user_id,
-            topic=topic,
-            difficulty_level=difficulty,  # Map 'difficulty' parameter to 'difficulty_level' field
-            score=score,
-            data=json.dumps({'last_updated': datetime.utcnow().isoformat()})
-        )
+        values = self._progress_values(topic, score, difficulty, user_id)
+        self._invalidate_adaptive(user_id, [topic])
+        
+        if self.write_buffer:
+            self.write_buffer.add(**values)
+            return
         
-        self.db.session.add(progress)
+        # Plain Core INSERT - no ORM object or unit-of-work bookkeeping for an append-only row
+        self.db.session.execute(insert(self.Progress), [values])
+        if commit:
+            self.db.session.commit()
+    
+    def bulk_update_progress(self, entries, user_id=1):
+        """
+        Record several progress entries at once
+        entries: list of dicts with 'topic', 'score' and optionally 'difficulty'
+        Without a write buffer, all rows go in one executemany INSERT and one commit
+        """
+        if not self.Progress:
+            from app import Progress as ProgressModel
+            self.Progress = ProgressModel
+        
+        rows = [
+            self._progress_values(entry['topic'], entry.get('score', 0), entry.get('difficulty', 'medium'), user_id)
+            for entry in entries
+        ]
+        if not rows:
+            return
+        self._invalidate_adaptive(user_id, [row['topic'] for row in rows])
+        
+        if self.write_buffer:
+            for values in rows:
+                self.write_buffer.add(**values)
+            return
+        
+        self.db.session.execute(insert(self.Progress), rows)
         self.db.session.commit()
     
+    def _invalidate_adaptive(self, user_id, topics):
+        """Forget cached adaptive difficulties that new scores for topics make stale"""
+        with self._adaptive_lock:
+            for topic in topics:
+                self._adaptive_cache.pop((user_id, topic), None)
+    
     def get_progress(self, user_id=1):
         """Get all progress for a user"""
         # Use the Progress model passed during initialization
@@ -46,18 +103,28 @@ class ProgressTracker:
             from app import Progress as ProgressModel
             self.Progress = ProgressModel
         
-        progress_entries = self.Progress.query.filter_by(user_id=user_id).all()
+        # Make sure this user's queued updates are visible before reading
+        if self.write_buffer:
+            self.write_buffer.flush()
         
-        progress_data = []
-        for entry in progress_entries:
-            progress_data.append({
-                'topic': entry.topic,
-                'difficulty': entry.difficulty_level,  # Map 'difficulty_level' field to 'difficulty' in response
-                'score': entry.score,
-                'completed_at': entry.completed_at.isoformat() if entry.completed_at else None
-            })
+        # Direct select on user_id - served by the (user_id, completed_at) index.
+        # Only the four needed columns are selected, as plain rows rather
+        # than ORM objects
+        rows = self.db.session.execute(
+            select(self.Progress.topic, self.Progress.difficulty_level,
+                   self.Progress.score, self.Progress.completed_at)
+            .where(self.Progress.user_id == user_id)
+        )
         
-        return progress_data
+        return [
+            {
+                'topic': topic,
+                'difficulty': difficulty,  # Map 'difficulty_level' field to 'difficulty' in response
+                'score': score,
+                'completed_at': completed_at.isoformat() if completed_at else None
+            }
+            for topic, difficulty, score, completed_at in rows
+        ]
     
     def get_adaptive_difficulty(self, topic, user_id=1):
         """
@@ -70,18 +137,37 @@ class ProgressTracker:
             from app import Progress as ProgressModel
             self.Progress = ProgressModel
         
-        # Get recent progress for this topic
-        recent_progress = self.Progress.query.filter_by(
-            user_id=user_id,
-            topic=topic
-        ).order_by(self.Progress.completed_at.desc()).limit(5).all()
+        key = (user_id, topic)
+        with self._adaptive_lock:
+            cached = self._adaptive_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ADAPTIVE_CACHE_TTL:
+            return cached[1]
         
-        if not recent_progress:
-            return 'medium'  # Default for new topics
+        difficulty = self._compute_adaptive_difficulty(topic, user_id)
+        with self._adaptive_lock:
+            self._adaptive_cache[key] = (time.monotonic(), difficulty)
+        return difficulty
+    
+    def _compute_adaptive_difficulty(self, topic, user_id):
+        """Adaptive difficulty from the last five scores on topic"""
+        # Queued updates must be written first, or a stale result would be cached
+        if self.write_buffer:
+            self.write_buffer.flush()
+        
+        # Average of the five most recent scores for this topic, computed
+        # by the database - only the single average comes back
+        recent_scores = (
+            select(self.Progress.score)
+            .where(self.Progress.user_id == user_id, self.Progress.topic == topic)
+            # id breaks ties between scores recorded within the same second
+            .order_by(self.Progress.completed_at.desc(), self.Progress.id.desc())
+            .limit(5)
+            .subquery()
+        )
+        avg_score = self.db.session.scalar(select(func.avg(recent_scores.c.score)))
         
-        # Calculate average score
-        scores = [p.score for p in recent_progress]
-        avg_score = sum(scores) / len(scores) if scores else 0
+        if avg_score is None:
+            return 'medium'  # Default for new topics
         
         # Adjust difficulty based on performance
         if avg_score >= 80:
@@ -8,7 +8,48 @@ import requests
 import json
 import html
 import random
+import threading
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional
+from modules.http_session import create_session
+
+# Open Trivia Database category ids for common topic keywords
+CATEGORY_MAP = {
+    'science': 17,
+    'mathematics': 19,
+    'computers': 18,
+    'history': 23,
+    'geography': 22,
+    'sports': 21,
+    'animals': 27,
+    'mythology': 20,
+    'politics': 24,
+    'art': 25,
+    'celebrities': 26,
+    'vehicles': 28,
+    'entertainment': None,  # Multiple subcategories
+    'general': 9
+}
+# OpenTDB serves one request per IP every 5 seconds; sooner ones get
+# response code 5 (or HTTP 429)
+OPENTDB_INTERVAL = 5.0
+
+# Keywords that map to a single category, in match order
+_CATEGORY_ITEMS = [(keyword, category_id) for keyword, category_id in CATEGORY_MAP.items() if category_id]
+
+@lru_cache(maxsize=256)
+def _category_for(topic: str) -> int:
+    """Category id for a topic - the first keyword it contains, else general knowledge"""
+    topic_lower = topic.lower()
+    
+    # Check for direct matches
+    for keyword, category_id in _CATEGORY_ITEMS:
+        if keyword in topic_lower:
+            return category_id
+    
+    # Return general knowledge as default
+    return 9
 
 class QuizFetcher:
     """Fetches quiz questions from internet sources"""
@@ -19,40 +60,31 @@ class QuizFetcher:
         ai_generator: Optional AIGenerator instance for fallback
         """
         self.ai_generator = ai_generator
+        # Keep-alive session shared by every request this fetcher makes. No
+        # status retries - a retried 429 would only spend more of the rate limit
+        self.session = create_session(retries=0)
+        # Own random generator for answer placement, separate from the shared module-level one
+        self._rng = random.Random()
         # Open Trivia Database API endpoint
         self.opentdb_base_url = "https://opentdb.com/api.php"
+        # Session token endpoint - a token makes OpenTDB skip questions it has
+        # already served, so back-to-back quizzes don't repeat each other
+        self.opentdb_token_url = "https://opentdb.com/api_token.php"
+        self._opentdb_token = None
+        self._opentdb_token_pending = False  # A background token call is scheduled
+        self._opentdb_token_lock = threading.Lock()
+        # Earliest time the next OpenTDB request may be sent
+        self._opentdb_next_slot = 0.0
+        self._opentdb_rate_lock = threading.Lock()
         # Category mapping for common topics
-        self.category_map = {
-            'science': 17,
-            'mathematics': 19,
-            'computers': 18,
-            'history': 23,
-            'geography': 22,
-            'sports': 21,
-            'animals': 27,
-            'mythology': 20,
-            'politics': 24,
-            'art': 25,
-            'celebrities': 26,
-            'vehicles': 28,
-            'entertainment': None,  # Multiple subcategories
-            'general': 9
-        }
+        self.category_map = CATEGORY_MAP
     
     def _map_topic_to_category(self, topic: str) -> Optional[int]:
         """
         Map a topic string to Open Trivia Database category ID
         Returns category ID or None if no match found
         """
-        topic_lower = topic.lower()
-        
-        # Check for direct matches
-        for keyword, category_id in self.category_map.items():
-            if keyword in topic_lower and category_id:
-                return category_id
-        
-        # Return general knowledge as default
-        return 9
+        return _category_for(topic)
     
     def _map_difficulty(self, difficulty: str) -> str:
         """
@@ -80,18 +112,12 @@ class QuizFetcher:
         question = self._decode_html_entities(q['question'])
         correct_answer = self._decode_html_entities(q['correct_answer'])
         
-        # Combine incorrect and correct answers, then shuffle
+        # Shuffle the incorrect answers, then insert the correct one at a
+        # random position - its index is known without searching for it
         all_answers = [self._decode_html_entities(ans) for ans in q['incorrect_answers']]
-        all_answers.append(correct_answer)
-        
-        # Find correct answer index after adding it
-        correct_index = len(all_answers) - 1
-        
-        # Shuffle answers to randomize option order
-        # Move correct answer to a random position
-        random.shuffle(all_answers)
-        # Find new correct index after shuffling
-        correct_index = all_answers.index(correct_answer)
+        self._rng.shuffle(all_answers)
+        correct_index = self._rng.randrange(len(all_answers) + 1)
+        all_answers.insert(correct_index, correct_answer)
         
         return {
             'question': question,
@@ -100,6 +126,83 @@ class QuizFetcher:
             'explanation': f"The correct answer is {correct_answer}."
         }
     
+    def _reserve_opentdb_slot(self, max_wait: float) -> bool:
+        """
+        Claim the next free OpenTDB request slot, sleeping until it comes
+        Returns False without claiming it if it is more than max_wait seconds away.
+        Quiz requests pass 0 and never sleep; only the background token refresh waits
+        """
+        with self._opentdb_rate_lock:
+            now = time.monotonic()
+            wait = max(0.0, self._opentdb_next_slot - now)
+            if wait > max_wait:
+                return False
+            self._opentdb_next_slot = now + wait + OPENTDB_INTERVAL
+        if wait:
+            time.sleep(wait)
+        return True
+    
+    def _opentdb_rate_limited(self):
+        """Push the next slot back after OpenTDB refused a request as too soon"""
+        with self._opentdb_rate_lock:
+            self._opentdb_next_slot = max(self._opentdb_next_slot, time.monotonic() + OPENTDB_INTERVAL)
+    
+    def _schedule_token_refresh(self, command: str = 'request', token: Optional[str] = None):
+        """
+        Request (command='request') or reset (command='reset') the OpenTDB session
+        token in the background, one rate-limit interval from now, so quiz
+        requests never spend their slot on a token call
+        """
+        with self._opentdb_token_lock:
+            if self._opentdb_token_pending:
+                return
+            self._opentdb_token_pending = True
+        timer = threading.Timer(OPENTDB_INTERVAL, self._refresh_opentdb_token, args=(command, token))
+        timer.daemon = True
+        timer.start()
+    
+    def _refresh_opentdb_token(self, command: str, token: Optional[str]):
+        """Make the token call scheduled by _schedule_token_refresh"""
+        new_token = None
+        try:
+            if self._reserve_opentdb_slot(OPENTDB_INTERVAL * 2):
+                params = {'command': command}
+                if token:
+                    params['token'] = token
+                response = self.session.get(self.opentdb_token_url, params=params, timeout=10)
+                response.raise_for_status()
+                data = response.json()
+                if data.get('response_code') == 0:
+                    new_token = data.get('token', token)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error refreshing Open Trivia DB token: {e}")
+        with self._opentdb_token_lock:
+            self._opentdb_token = new_token
+            self._opentdb_token_pending = False
+    
+    def _get_opentdb_token(self) -> Optional[str]:
+        """Current OpenTDB session token, or None while one is being requested"""
+        with self._opentdb_token_lock:
+            token = self._opentdb_token
+        if token is None:
+            self._schedule_token_refresh('request')
+        return token
+    
+    def _renew_opentdb_token(self, token: str, response_code: int):
+        """
+        Recover from a token error on a quiz request
+        Code 4 means every matching question was served - reset the token;
+        code 3 means it expired - drop it so a new one is requested
+        """
+        with self._opentdb_token_lock:
+            if self._opentdb_token != token:
+                return  # Another request already renewed it
+            self._opentdb_token = None
+        if response_code == 4:
+            self._schedule_token_refresh('reset', token)
+        else:
+            self._schedule_token_refresh('request')
+    
     def fetch_from_opentdb(self, topic: str, num_questions: int, difficulty: str) -> Optional[Dict]:
         """
         Fetch quiz questions from Open Trivia Database API
@@ -121,11 +224,32 @@ class QuizFetcher:
             if category_id:
                 params['category'] = category_id
             
-            # Make API request
-            response = requests.get(self.opentdb_base_url, params=params, timeout=10)
+            token = self._get_opentdb_token()
+            if token:
+                params['token'] = token
+            
+            # Quiz requests never wait for OpenTDB - if its rate limit is
+            # spent right now, the caller falls back to AI generation
+            if not self._reserve_opentdb_slot(0):
+                print("Open Trivia DB is busy (rate limited), skipping it")
+                return None
+            response = self.session.get(self.opentdb_base_url, params=params, timeout=10)
+            if response.status_code == 429:
+                self._opentdb_rate_limited()
+                return None
             response.raise_for_status()
             
             data = response.json()
+            if token and data.get('response_code') in (3, 4):
+                # Token spent or expired - it is renewed in the background,
+                # and a retry now would only be refused as too soon
+                self._renew_opentdb_token(token, data['response_code'])
+                return None
+            
+            if data.get('response_code') == 5:
+                # Rate limited - another process or client shares this IP
+                self._opentdb_rate_limited()
+                return None
             
             # Check if request was successful
             if data.get('response_code') == 0 and data.get('results'):
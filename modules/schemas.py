@@ -0,0 +1,71 @@
+"""
+Request Schemas Module
+Typed request bodies for the generation endpoints. msgspec decodes and
+validates a JSON body in a single C-level pass, replacing per-field
+dict lookups in the route handlers.
+"""
+
+from typing import Annotated, Literal, Optional
+import msgspec
+from modules.ai_generator import MAX_FANOUT_ITEMS
+
+# Quiz questions and flashcards are one AI request each, so their count is bounded
+ItemCount = Annotated[int, msgspec.Meta(ge=1, le=MAX_FANOUT_ITEMS)]
+ContentType = Literal['notes', 'summary', 'quiz', 'flashcards', 'diagram_description', 'video_script']
+Difficulty = Literal['easy', 'medium', 'hard']
+# Maximum number of items accepted by /generate/batch in one request
+MAX_BATCH_ITEMS = 20
+
+class GenerateRequest(msgspec.Struct):
+    """Body of POST /generate"""
+    topic: str
+    content_type: ContentType = 'notes'
+    difficulty: Difficulty = 'medium'
+    language: str = 'en'
+    use_internet: bool = False  # Option to generate from internet
+    num_questions: ItemCount = 10  # Only used for quizzes
+    background: Optional[bool] = None  # Defaults to use_internet when job state is shared - scraping is slow
+
+class BatchRequest(msgspec.Struct):
+    """Body of POST /generate/batch - each item is validated like a /generate body"""
+    items: Annotated[list[GenerateRequest], msgspec.Meta(min_length=1, max_length=MAX_BATCH_ITEMS)]
+    background: bool = False
+
+class QuizRequest(msgspec.Struct):
+    """Body of POST /quiz"""
+    topic: str
+    num_questions: ItemCount = 10
+    difficulty: str = 'medium'
+    background: Optional[bool] = None  # Defaults to on when job state is shared - the quiz APIs are slow
+
+class FlashcardsRequest(msgspec.Struct):
+    """Body of POST /flashcards"""
+    topic: str
+    num_cards: ItemCount = 20
+    background: bool = False
+
+class DoubtRequest(msgspec.Struct):
+    """Body of POST /doubt-solve"""
+    question: str
+    context: str = ''
+
+class LessonPlanRequest(msgspec.Struct):
+    """Body of POST /lesson-plan"""
+    topic: str
+    duration: int = 60  # minutes
+    grade_level: str = 'middle'
+    background: bool = False
+
+class HomeworkRequest(msgspec.Struct):
+    """Body of POST /homework"""
+    topic: str
+    difficulty: str = 'medium'
+    background: bool = False
+
+def parse_request(body, schema):
+    """
+    Decode and validate a raw JSON request body against schema
+    Raises msgspec.DecodeError (or its subclass ValidationError) on invalid input
+    """
+    # strict=False accepts numbers sent as strings, e.g. "10" for num_questions
+    return msgspec.json.decode(body, type=schema, strict=False)
@@ -0,0 +1,61 @@
+"""
+Semantic Cache Module
+Caches AI responses by prompt embedding, so prompts that only differ in
+wording ("notes on photosynthesis" / "study notes about photosynthesis")
+reuse one response. Lookup is a single matrix-vector product over the
+normalized embeddings of every cached prompt.
+"""
+
+import threading
+import numpy as np
+
+class SemanticCache:
+    """Nearest-neighbour response cache over prompt embeddings"""
+    
+    def __init__(self, threshold=0.92, max_entries=1024):
+        """
+        Initialize semantic cache
+        threshold: minimum cosine similarity for a cached response to be reused
+        max_entries: once full, the oldest entries are overwritten
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectors = None  # (max_entries, dim) unit vectors, allocated on first add
+        self.responses = [None] * max_entries
+        self.count = 0
+        self.next_slot = 0
+        self.lock = threading.Lock()
+    
+    def _normalize(self, embedding):
+        """Embedding as a float32 unit vector, or None if it has no length"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    
+    def lookup(self, embedding):
+        """Return the cached response closest to embedding, or None if none is similar enough"""
+        query = self._normalize(embedding)
+        with self.lock:
+            if query is None or not self.count or query.shape[0] != self.vectors.shape[1]:
+                return None
+            # Rows are unit vectors, so the dot product is the cosine similarity
+            scores = self.vectors[:self.count] @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return self.responses[best]
+        return None
+    
+    def add(self, embedding, response):
+        """Store response under embedding"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self.vectors.shape[1]:
+                return
+            self.vectors[self.next_slot] = vector
+            self.responses[self.next_slot] = response
+            self.next_slot = (self.next_slot + 1) % self.max_entries
+            self.count = min(self.count + 1, self.max_entries)
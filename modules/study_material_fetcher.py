@@ -7,9 +7,19 @@ and other educational websites. Compiles information to create comprehensive stu
 import requests
 import json
 import html
-import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from urllib.parse import quote
+from modules.ai_generator import MAX_OUTPUT_TOKENS, DEFAULT_MAX_TOKENS, truncate
+from modules.http_session import create_session
+
+# Wikipedia lookups (including "no such page") are reused for this many
+# seconds; at most WIKIPEDIA_CACHE_SIZE queries are kept
+WIKIPEDIA_CACHE_TTL = 3600
+WIKIPEDIA_CACHE_SIZE = 512
 
 class StudyMaterialFetcher:
     """Fetches study material from internet sources"""
@@ -20,6 +30,11 @@ class StudyMaterialFetcher:
         ai_generator: Optional AIGenerator instance for compiling and enhancing content
         """
         self.ai_generator = ai_generator
+        # Keep-alive session shared by every request this fetcher makes
+        self.session = create_session()
+        # query -> (fetched at, result or None)
+        self._wiki_cache = OrderedDict()
+        self._wiki_cache_lock = threading.Lock()
         # Wikipedia API endpoint
         self.wikipedia_api_url = "https://en.wikipedia.org/api/rest_v1/page/summary/"
         # Wikipedia search API
@@ -33,24 +48,60 @@ class StudyMaterialFetcher:
         """
         if not text:
             return ""
-        # Decode HTML entities
-        text = html.unescape(text)
-        # Remove basic HTML tags (simple approach)
-        text = re.sub(r'<[^>]+>', '', text)
-        return text.strip()
+        # One pass: skip tags and decode entities only in the text between them
+        parts = []
+        i = 0
+        while True:
+            lt = text.find('<', i)
+            gt = text.find('>', lt + 1) if lt >= 0 else -1
+            if gt < 0:
+                # No further complete tag - an unterminated '<' is kept as text
+                segment, i = text[i:], -1
+            elif gt == lt + 1:
+                # '<>' is not a tag
+                segment, i = text[i:gt], gt
+            else:
+                segment, i = text[i:lt], gt + 1
+            parts.append(html.unescape(segment) if '&' in segment else segment)
+            if i < 0:
+                break
+        return ''.join(parts).strip()
     
-    def fetch_from_wikipedia(self, topic: str) -> Optional[Dict]:
+    def fetch_from_wikipedia(self, topic: str, refine: bool = True) -> Optional[Dict]:
         """
         Fetch information from Wikipedia API
         Returns summary and extract from Wikipedia page
+        refine: look up a better match with the search API when the extract is short
+        Answers are cached for WIKIPEDIA_CACHE_TTL seconds; network errors are not
         """
+        key = (topic, refine)
+        with self._wiki_cache_lock:
+            cached = self._wiki_cache.get(key)
+        if cached and time.monotonic() - cached[0] < WIKIPEDIA_CACHE_TTL:
+            return cached[1]
+        
+        try:
+            result = self._fetch_from_wikipedia(topic, refine)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching from Wikipedia: {e}")
+            return None
+        
+        with self._wiki_cache_lock:
+            self._wiki_cache[key] = (time.monotonic(), result)
+            self._wiki_cache.move_to_end(key)
+            if len(self._wiki_cache) > WIKIPEDIA_CACHE_SIZE:
+                self._wiki_cache.popitem(last=False)
+        return result
+    
+    def _fetch_from_wikipedia(self, topic: str, refine: bool = True) -> Optional[Dict]:
+        """Uncached fetch_from_wikipedia - raises requests exceptions on network errors"""
         try:
             # URL encode the topic
             encoded_topic = quote(topic)
             
             # Try to get page summary
             url = f"{self.wikipedia_api_url}{encoded_topic}"
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -65,10 +116,10 @@ class StudyMaterialFetcher:
                 }
                 
                 # If extract is too short, try to get full page content
-                if len(result['extract']) < 200:
+                if refine and len(result['extract']) < 200:
                     # Try search API to find better match
                     search_url = f"{self.wikipedia_search_url}?q={encoded_topic}&limit=1"
-                    search_response = requests.get(search_url, timeout=10)
+                    search_response = self.session.get(search_url, timeout=10)
                     if search_response.status_code == 200:
                         search_data = search_response.json()
                         if search_data.get('pages'):
@@ -78,9 +129,8 @@ class StudyMaterialFetcher:
                 
                 return result if result.get('extract') else None
                 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching from Wikipedia: {e}")
-            return None
+        except requests.exceptions.RequestException:
+            raise
         except Exception as e:
             print(f"Error processing Wikipedia response: {e}")
             return None
@@ -111,8 +161,10 @@ class StudyMaterialFetcher:
         """
         all_content = []
         
-        # Fetch from Wikipedia (primary source)
-        wikipedia_data = self.fetch_from_wikipedia(topic)
+        # Fetch from Wikipedia (primary source). A short extract is followed
+        # up by the alternative queries below, so the search API refinement
+        # would only be a redundant extra request here
+        wikipedia_data = self.fetch_from_wikipedia(topic, refine=False)
         if wikipedia_data:
             all_content.append(wikipedia_data)
         
@@ -125,11 +177,14 @@ class StudyMaterialFetcher:
                 f"what is {topic}"
             ]
             
-            for alt_query in alternative_queries:
-                alt_data = self.fetch_from_wikipedia(alt_query)
-                if alt_data and len(alt_data.get('extract', '')) > 100:
-                    all_content.append(alt_data)
-                    break
+            # The lookups are independent, so they run concurrently - the
+            # slow path costs one round trip instead of up to three. The
+            # first good result in the order above is still the one used
+            with ThreadPoolExecutor(max_workers=len(alternative_queries)) as pool:
+                for alt_data in pool.map(self.fetch_from_wikipedia, alternative_queries):
+                    if alt_data and len(alt_data.get('extract', '')) > 100:
+                        all_content.append(alt_data)
+                        break
         
         return {
             'topic': topic,
@@ -152,7 +207,7 @@ class StudyMaterialFetcher:
             sources_text = ""
             for source in internet_content['sources']:
                 sources_text += f"\n\nSource: {source.get('title', 'Unknown')} ({source.get('source', 'Unknown')})\n"
-                sources_text += f"{source.get('extract', '')}\n"
+                sources_text += f"{truncate(source.get('extract', ''))}\n"
                 if source.get('url'):
                     sources_text += f"Reference: {source.get('url')}\n"
             
@@ -200,7 +255,7 @@ Use this information to create accurate and comprehensive content."""
             
             # Generate content using AI with internet sources
             if hasattr(self.ai_generator, '_call_ai'):
-                ai_result = self.ai_generator._call_ai(prompt, max_tokens=3000)
+                ai_result = self.ai_generator._call_ai(prompt, max_tokens=MAX_OUTPUT_TOKENS.get(content_type, DEFAULT_MAX_TOKENS))
             else:
                 # Fallback if _call_ai is not available
                 ai_result = self.ai_generator.generate(
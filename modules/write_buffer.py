@@ -0,0 +1,92 @@
+"""
+Write Buffer Module
+Collects rows from many requests and inserts them in batches from a single
+background thread, so concurrent writers share one INSERT and one commit
+instead of paying a commit (and WAL flush) each.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from sqlalchemy import insert
+
+class WriteBuffer:
+    """Batches inserts for one model and writes them in the background"""
+    
+    def __init__(self, app, db, model, max_batch=100, max_delay=0.05):
+        """
+        Initialize write buffer
+        app: Flask app - batches are written inside its application context
+        model: SQLAlchemy model the buffered rows are inserted into
+        max_batch: write as soon as this many rows are waiting
+        max_delay: seconds the oldest row may wait before it is written
+        """
+        self.app = app
+        self.db = db
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, name='edumentor-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+    
+    def add(self, **values):
+        """Queue a row for insertion"""
+        self.queue.put(values)
+    
+    def flush(self, timeout=5):
+        """Block until every row queued before this call has been written"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+    
+    def _worker(self):
+        """Collect rows into batches and write them"""
+        while True:
+            item = self.queue.get()
+            rows, waiters = [], []
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                if isinstance(item, threading.Event):
+                    # A flush request - write what we have right away
+                    waiters.append(item)
+                    break
+                rows.append(item)
+                if len(rows) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            
+            if rows:
+                self._write(rows)
+            for waiter in waiters:
+                waiter.set()
+    
+    def _write(self, rows):
+        """Insert a batch of rows in one executemany and commit once"""
+        with self.app.app_context():
+            try:
+                self.db.session.execute(insert(self.model), rows)
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                self.app.logger.warning('Batch insert of %d %s rows failed, retrying them one at a time',
+                                        len(rows), self.model.__name__, exc_info=True)
+                self._write_each(rows)
+    
+    def _write_each(self, rows):
+        """Insert rows one by one, so a bad row only loses itself"""
+        for values in rows:
+            try:
+                self.db.session.execute(insert(self.model), [values])
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                self.app.logger.exception('Dropped buffered %s row %r', self.model.__name__, values)
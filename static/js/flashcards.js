@@ -27,7 +27,7 @@ function initializeFlashcardsPage() {
  */
 async function generateFlashcards() {
     const topic = document.getElementById('flashcardTopic').value.trim();
-    const numCards = parseInt(document.getElementById('numCards').value) || 20;
+    const numCards = readCount('numCards', 20);  // readCount is in main.js
     
     if (!topic) {
         alert('Please enter a topic for flashcards');
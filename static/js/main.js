@@ -91,7 +91,7 @@ async function generateContent() {
     const useInternet = document.getElementById('useInternet') ? document.getElementById('useInternet').checked : false;
     // Get number of questions for quiz
     const numQuestions = selectedContentType === 'quiz' ? 
-        (parseInt(document.getElementById('numQuestions').value) || 10) : 10;
+        readCount('numQuestions', 10) : 10;
     
     if (!topic) {
         alert('Please enter a topic');
@@ -125,7 +125,13 @@ async function generateContent() {
             body: JSON.stringify(requestBody)
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        
+        // Internet-sourced content is generated in the background
+        if (response.status === 202) {
+            const job = await waitForJob(data.job_id);
+            data = job.success ? { success: true, ...job.result } : job;
+        }
         
         if (data.success) {
             currentContent = data.content;
@@ -293,7 +299,7 @@ function flipCard(element) {
  */
 async function generateQuiz() {
     const topic = document.getElementById('quizTopic').value.trim();
-    const numQuestions = parseInt(document.getElementById('numQuestions').value) || 10;
+    const numQuestions = readCount('numQuestions', 10);
     
     if (!topic) {
         alert('Please enter a topic for the quiz');
@@ -315,7 +321,13 @@ async function generateQuiz() {
             })
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        
+        // Quizzes are fetched in the background
+        if (response.status === 202) {
+            const job = await waitForJob(data.job_id);
+            data = job.success ? { success: true, quiz: job.result } : job;
+        }
         
         if (data.success) {
             const quizContainer = document.getElementById('quizResults');
@@ -335,7 +347,7 @@ async function generateQuiz() {
  */
 async function generateFlashcards() {
     const topic = document.getElementById('flashcardTopic').value.trim();
-    const numCards = parseInt(document.getElementById('numCards').value) || 20;
+    const numCards = readCount('numCards', 20);
     
     if (!topic) {
         alert('Please enter a topic for flashcards');
@@ -608,6 +620,41 @@ function initializeMobileMenu() {
     }
 }
 
+/**
+ * Wait for a background job to finish
+ * Slow requests answer 202 with a job_id; poll /jobs/<id> until the job
+ * succeeds or fails. Resolves to {success, result} or {success: false, error}
+ */
+async function waitForJob(jobId, intervalMs = 1000, timeoutMs = 300000) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (!job.success) {
+            return { success: false, error: job.error || 'Job not found' };
+        }
+        if (job.state === 'SUCCESS') {
+            return { success: true, result: job.result };
+        }
+        if (job.state === 'FAILURE') {
+            return { success: false, error: job.error };
+        }
+    }
+    return { success: false, error: 'Timed out waiting for the result' };
+}
+
+/**
+ * Read a count from a number input, clamped to the input's min and max
+ * The server rejects counts outside that range
+ */
+function readCount(id, fallback) {
+    const input = document.getElementById(id);
+    const value = parseInt(input.value) || fallback;
+    return Math.min(Math.max(value, parseInt(input.min) || 1), parseInt(input.max) || value);
+}
+
 /**
  * Escape HTML to prevent XSS
  */
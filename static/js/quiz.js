@@ -39,7 +39,7 @@ function initializeQuizPage() {
  */
 async function generateQuiz() {
     const topic = document.getElementById('quizTopic').value.trim();
-    const numQuestions = parseInt(document.getElementById('numQuestions').value) || 10;
+    const numQuestions = readCount('numQuestions', 10);  // readCount is in main.js
     const difficulty = document.getElementById('difficulty').value;
     
     if (!topic) {
@@ -66,7 +66,13 @@ async function generateQuiz() {
             })
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        
+        // Quizzes are fetched in the background - waitForJob is in main.js
+        if (response.status === 202) {
+            const job = await waitForJob(data.job_id);
+            data = job.success ? { success: true, quiz: job.result } : job;
+        }
         
         if (data.success) {
             // Store quiz data globally